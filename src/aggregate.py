@@ -20,16 +20,20 @@ def aggregate(items: List[Dict]) -> Tuple[float, float, pd.DataFrame, pd.DataFra
     by_category = df.groupby("category", dropna=False)["emissions_kg"].sum().reset_index()
 
     max_emissions = by_supplier["emissions_kg"].max() if not by_supplier.empty else 0
-    by_supplier["score"] = by_supplier["emissions_kg"].apply(
-        lambda x: round(100 * (1 - (x / max_emissions)), 2) if max_emissions else 0
-    )
-    by_supplier["comments"] = by_supplier["score"].apply(
-        lambda s: "High impact, prioritize reduction" if s < 40 else "Moderate" if s < 70 else "Lower impact"
-    )
+    by_supplier["score"] = by_supplier["emissions_kg"].apply(lambda x: _score(x, max_emissions))
+    by_supplier["comments"] = by_supplier["score"].apply(_comment)
 
     return total_emissions, total_spend, df, by_supplier, by_category
 
 
+def _score(emissions: float, max_emissions: float) -> float:
+    return round(100 * (1 - (emissions / max_emissions)), 2) if max_emissions else 0
+
+
+def _comment(score: float) -> str:
+    return "High impact, prioritize reduction" if score < 40 else "Moderate" if score < 70 else "Lower impact"
+
+
 def recommendation(by_supplier: pd.DataFrame) -> str:
     if by_supplier.empty:
         return "No suppliers detected."
@@ -40,8 +44,9 @@ def recommendation(by_supplier: pd.DataFrame) -> str:
 
 def build_analysis(invoice_id: str, items: List[Dict]) -> Dict:
     total, total_spend, df, by_supplier, by_category = aggregate(items)
-    top_supplier = by_supplier.sort_values("emissions_kg", ascending=False).iloc[0]["supplier"] if not by_supplier.empty else None
-    top_category = by_category.sort_values("emissions_kg", ascending=False).iloc[0]["category"] if not by_category.empty else None
+    # Stable sort so ties always go to the first supplier/category rather than depending on the sort kernel.
+    top_supplier = by_supplier.sort_values("emissions_kg", ascending=False, kind="stable").iloc[0]["supplier"] if not by_supplier.empty else None
+    top_category = by_category.sort_values("emissions_kg", ascending=False, kind="stable").iloc[0]["category"] if not by_category.empty else None
 
     return {
         "invoice_id": invoice_id,
@@ -55,3 +60,66 @@ def build_analysis(invoice_id: str, items: List[Dict]) -> Dict:
         "hotspots": {"top_supplier": top_supplier, "top_category": top_category},
         "items": items,
     }
+
+
+def build_analyses(
+    df: pd.DataFrame, invoice_ids: List[str], items_by_invoice: Dict[str, List[Dict]]
+) -> Dict[str, Dict]:
+    """
+    Vectorized build_analysis for many invoices at once.
+    `df` holds the enriched items of all invoices with an `invoice_id` column; the groupbys run once
+    for the whole frame instead of once per invoice.
+    """
+    analyses = {
+        invoice_id: build_analysis(invoice_id, items_by_invoice.get(invoice_id, []))
+        for invoice_id in invoice_ids
+        if not items_by_invoice.get(invoice_id)
+    }
+    if df.empty:
+        return analyses
+
+    df = df.copy()
+    df["amount_usd"] = df["amount_usd"].fillna(0) if "amount_usd" in df else 0.0
+
+    by_supplier = (
+        df.groupby(["invoice_id", "supplier"], dropna=False)
+        .agg(emissions_kg=("emissions_kg", "sum"), spend=("amount_usd", "sum"))
+        .reset_index()
+    )
+    # Scores and comments go through the same helpers as aggregate() so both paths agree exactly.
+    max_emissions = by_supplier.groupby("invoice_id")["emissions_kg"].transform("max").tolist()
+    scores = [_score(x, m) for x, m in zip(by_supplier["emissions_kg"].tolist(), max_emissions)]
+    by_supplier["score"] = pd.Series(scores, index=by_supplier.index, dtype=object)
+    by_supplier["comments"] = [_comment(score) for score in scores]
+    by_category = df.groupby(["invoice_id", "category"], dropna=False)["emissions_kg"].sum().reset_index()
+
+    # Ties go to the first row, as with the stable sort in build_analysis.
+    top_supplier = by_supplier.loc[by_supplier.groupby("invoice_id")["emissions_kg"].idxmax()]
+    top_supplier = top_supplier.set_index("invoice_id")["supplier"]
+    top_category = by_category.loc[by_category.groupby("invoice_id")["emissions_kg"].idxmax()]
+    top_category = top_category.set_index("invoice_id")["category"]
+
+    supplier_records: Dict[str, List[Dict]] = {}
+    for record in by_supplier.to_dict(orient="records"):
+        supplier_records.setdefault(record.pop("invoice_id"), []).append(record)
+    category_records: Dict[str, List[Dict]] = {}
+    for record in by_category.to_dict(orient="records"):
+        category_records.setdefault(record.pop("invoice_id"), []).append(record)
+
+    emissions = df["emissions_kg"].to_numpy(dtype="float64")
+    spend = df["amount_usd"].to_numpy(dtype="float64")
+    # Totals are summed per invoice in item order, as aggregate() does, so rounding matches to the cent.
+    for invoice_id, rows in df.groupby("invoice_id", sort=False).indices.items():
+        analyses[invoice_id] = {
+            "invoice_id": invoice_id,
+            "summary": {
+                "total_emissions_kg": round(emissions[rows].sum(), 2),
+                "currency": "USD",
+                "total_spend": round(float(spend[rows].sum()), 2),
+            },
+            "by_supplier": supplier_records.get(invoice_id, []),
+            "by_category": category_records.get(invoice_id, []),
+            "hotspots": {"top_supplier": top_supplier.get(invoice_id), "top_category": top_category.get(invoice_id)},
+            "items": items_by_invoice[invoice_id],
+        }
+    return analyses
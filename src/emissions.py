@@ -1,9 +1,13 @@
-from typing import Dict
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
 
 from .categorize import categorize
+from .sector_index import SectorIndex
 
 
-def compute_emissions(item: Dict, factors: Dict[str, float]) -> Dict:
+def compute_emissions(item: Dict, factors: Dict[str, float], sectors: Optional[SectorIndex] = None) -> Dict:
     enriched = dict(item)
     category = item.get("category") or categorize(item.get("description", ""))
     enriched["category"] = category or "other"
@@ -22,7 +26,81 @@ def compute_emissions(item: Dict, factors: Dict[str, float]) -> Dict:
     elif enriched["category"] == "transport" and weight_tons and distance_km:
         emissions = weight_tons * distance_km * factors["transport_per_tkm"]
     elif amount_usd is not None:
-        emissions = amount_usd * factors["other_per_usd"]
+        # Spend-based fallback: use the item's sector factor when the sector table resolves it.
+        match = None
+        if sectors is not None:
+            match = sectors.factor_for(item.get("description", ""), item.get("sector_code"), item.get("product_code"))
+        if match is not None:
+            enriched["sector"], per_usd = match
+        else:
+            per_usd = factors["other_per_usd"]
+        emissions = amount_usd * per_usd
 
     enriched["emissions_kg"] = round(emissions, 2)
     return enriched
+
+
+def compute_emissions_frame(
+    df: pd.DataFrame, factors: Dict[str, float], sectors: Optional[SectorIndex] = None
+) -> pd.DataFrame:
+    """
+    Vectorized compute_emissions over a frame of parsed items (one row per item).
+    Missing numeric fields are NaN; the rules and their precedence match compute_emissions.
+    """
+    out = df.copy()
+    for column in ("category", "description", "qty_kg", "amount_usd", "weight_tons", "distance_km"):
+        if column not in out:
+            out[column] = None if column in ("category", "description") else np.nan
+
+    category = out["category"].where(out["category"].notna() & (out["category"] != ""), None)
+    missing = category.isna()
+    if missing.any():
+        # Categorize each distinct description once; invoices repeat the same lines a lot.
+        descriptions = out.loc[missing, "description"].fillna("")
+        lookup = {desc: categorize(desc) for desc in descriptions.unique()}
+        category = category.where(~missing, descriptions.map(lookup))
+    out["category"] = category.fillna("other")
+
+    qty = pd.to_numeric(out["qty_kg"], errors="coerce")
+    amount = pd.to_numeric(out["amount_usd"], errors="coerce")
+    tons = pd.to_numeric(out["weight_tons"], errors="coerce")
+    km = pd.to_numeric(out["distance_km"], errors="coerce")
+
+    has_qty = qty.notna() & (qty != 0)
+    has_leg = tons.notna() & (tons != 0) & km.notna() & (km != 0)
+    cat = out["category"]
+    physical = ((cat == "steel") | (cat == "packaging")) & has_qty | (cat == "transport") & has_leg
+
+    per_usd = pd.Series(factors["other_per_usd"], index=out.index, dtype="float64")
+    if sectors is not None:
+        spend = out[~physical & amount.notna()]
+        codes = {
+            column: [None if pd.isna(v) else v for v in spend[column]] if column in spend else [None] * len(spend)
+            for column in ("sector_code", "product_code")
+        }
+        keys = list(zip(spend["description"].fillna(""), codes["sector_code"], codes["product_code"]))
+        # Resolve each distinct (description, sector_code, product_code) once.
+        lookup = {key: sectors.factor_for(*key) for key in set(keys)}
+        matches = [lookup[key] for key in keys]
+        if any(matches):
+            out["sector"] = pd.Series([m[0] if m else None for m in matches], index=spend.index)
+            per_usd.loc[spend.index] = [m[1] if m else factors["other_per_usd"] for m in matches]
+
+    emissions = np.select(
+        [
+            (cat == "steel") & has_qty,
+            (cat == "packaging") & has_qty,
+            (cat == "transport") & has_leg,
+            amount.notna(),
+        ],
+        [
+            qty * factors["steel_per_kg"],
+            qty * factors["packaging_per_kg"],
+            tons * km * factors["transport_per_tkm"],
+            amount * per_usd,
+        ],
+        default=0.0,
+    )
+    # Python's round, not np.round: numpy rounds halves to even on a scaled value and can differ by a cent.
+    out["emissions_kg"] = [round(value, 2) for value in emissions.tolist()]
+    return out
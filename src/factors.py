@@ -1,6 +1,9 @@
+import hashlib
 import json
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Optional
+
+from .sector_index import SectorIndex
 
 DEFAULT_FACTORS = {
     "steel_per_kg": 2.0,
@@ -18,3 +21,11 @@ def load_factors(path: str = "data/emission_factors.json") -> Dict[str, float]:
         except Exception:
             return DEFAULT_FACTORS
     return DEFAULT_FACTORS
+
+
+def factor_version(factors: Dict[str, float], sectors: Optional[SectorIndex] = None) -> str:
+    """Short, stable fingerprint of a factor set (and sector table) so stored results can be tied to it."""
+    payload = json.dumps(factors, sort_keys=True, separators=(",", ":"))
+    if sectors is not None:
+        payload += f"|sectors:{sectors.fingerprint}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:12]
@@ -0,0 +1,467 @@
+import argparse
+import io
+import os
+import sys
+import time
+import uuid
+from contextlib import closing, contextmanager
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - no advisory locks on Windows; compaction is then single-writer only
+    fcntl = None
+
+HISTORY_DIR = os.getenv("SCOPE3_HISTORY_DIR", "data/history")
+
+HISTORY_SCHEMA = pa.schema(
+    [
+        ("invoice_id", pa.string()),
+        ("analyzed_at", pa.timestamp("us", tz="UTC")),
+        ("factor_version", pa.string()),
+        ("recorded_at", pa.timestamp("us", tz="UTC")),
+        ("supplier", pa.string()),
+        ("supplier_raw", pa.string()),
+        ("category", pa.string()),
+        ("sector", pa.string()),
+        ("description", pa.string()),
+        ("amount_usd", pa.float64()),
+        ("qty_kg", pa.float64()),
+        ("weight_tons", pa.float64()),
+        ("distance_km", pa.float64()),
+        ("emissions_kg", pa.float64()),
+    ]
+)
+
+# Files are laid out as <root>/month=YYYY-MM/<file>.parquet so month filters prune whole directories.
+PARTITIONING = ds.partitioning(pa.schema([("month", pa.string())]), flavor="hive")
+DATASET_SCHEMA = HISTORY_SCHEMA.append(pa.field("month", pa.string()))
+# Per-item columns, copied from the analysis items; the ones before them describe the write.
+ITEM_COLUMNS = HISTORY_SCHEMA.names[4:]
+# Columns needed to keep only each invoice's latest write (recorded_at is null in files written before it existed).
+LATEST_KEY_COLUMNS = ["invoice_id", "recorded_at", "analyzed_at"]
+
+# Scans hold STORE_LOCK shared; compaction holds it exclusively only while swapping files, so a scan sees
+# either the old files or the compacted one, never both or a deleted file. COMPACT_LOCK (per partition)
+# keeps two compactions of the same month from running at once.
+STORE_LOCK = "_store.lock"
+COMPACT_LOCK = "_compact.lock"
+
+DateLike = Union[str, date, datetime]
+Filter = Union[str, Sequence[str], None]
+
+
+def _root(root: Optional[str]) -> Path:
+    return Path(root or HISTORY_DIR)
+
+
+def _month(ts: datetime) -> str:
+    return ts.strftime("%Y-%m")
+
+
+def _to_datetime(value: DateLike, end: bool = False) -> datetime:
+    """
+    Normalize a date bound to an aware UTC datetime.
+    Plain dates cover the whole day, so an end bound moves to the start of the next day (exclusive).
+    """
+    is_day = isinstance(value, date) and not isinstance(value, datetime)
+    if isinstance(value, str):
+        is_day = len(value.strip()) == 10
+        value = datetime.fromisoformat(value.strip())
+    if is_day:
+        value = datetime(value.year, value.month, value.day)
+        if end:
+            value += timedelta(days=1)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+@contextmanager
+def _flock(path: Path, exclusive: bool, blocking: bool = True) -> Iterator[bool]:
+    """Hold an advisory lock on `path`; yields False if non-blocking and already held elsewhere."""
+    if fcntl is None:
+        yield True
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("a") as fh:
+        flags = (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | (0 if blocking else fcntl.LOCK_NB)
+        try:
+            fcntl.flock(fh, flags)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def _items_table(
+    invoice_id: str, items: List[Dict], analyzed_at: datetime, factor_version: str, recorded_at: datetime
+) -> pa.Table:
+    columns = {
+        "invoice_id": [invoice_id] * len(items),
+        "analyzed_at": [analyzed_at] * len(items),
+        "factor_version": [factor_version] * len(items),
+        "recorded_at": [recorded_at] * len(items),
+    }
+    for name in ITEM_COLUMNS:
+        columns[name] = [item.get(name) for item in items]
+    return pa.Table.from_pydict(columns, schema=HISTORY_SCHEMA)
+
+
+def _write_partition(table: pa.Table, month: str, name: str, root: Optional[str]) -> Path:
+    partition = _root(root) / f"month={month}"
+    partition.mkdir(parents=True, exist_ok=True)
+    target = partition / name
+    # Write next to the target and rename so concurrent readers never see a half-written file.
+    tmp = partition / f".{target.name}.tmp"
+    pq.write_table(table, tmp)
+    os.replace(tmp, target)
+    return target
+
+
+def append_items(
+    invoice_id: str,
+    items: List[Dict],
+    analyzed_at: datetime,
+    factor_version: str,
+    root: Optional[str] = None,
+    recorded_at: Optional[datetime] = None,
+) -> Optional[Path]:
+    """
+    Append the line items of one analysis to the month partition of the history store.
+    `recorded_at` (default: analyzed_at) orders repeated writes for the same invoice; queries keep the latest.
+    """
+    if not items:
+        return None
+
+    analyzed_at = _to_datetime(analyzed_at)
+    recorded_at = analyzed_at if recorded_at is None else _to_datetime(recorded_at)
+    table = _items_table(invoice_id, items, analyzed_at, factor_version, recorded_at)
+    return _write_partition(table, _month(analyzed_at), f"{invoice_id}-{factor_version}.parquet", root)
+
+
+def append_batch(
+    analyses: List[Tuple[str, List[Dict], datetime]],
+    factor_version: str,
+    root: Optional[str] = None,
+    recorded_at: Optional[datetime] = None,
+) -> List[Path]:
+    """
+    Append many analyses, given as (invoice_id, items, analyzed_at), with one file per month touched.
+    All rows share `recorded_at` (default: now), e.g. the time of a recompute run.
+    """
+    recorded_at = datetime.now(timezone.utc) if recorded_at is None else _to_datetime(recorded_at)
+    by_month: Dict[str, List[pa.Table]] = {}
+    for invoice_id, items, analyzed_at in analyses:
+        if not items:
+            continue
+        analyzed_at = _to_datetime(analyzed_at)
+        by_month.setdefault(_month(analyzed_at), []).append(
+            _items_table(invoice_id, items, analyzed_at, factor_version, recorded_at)
+        )
+
+    name = f"batch-{uuid.uuid4().hex}-{factor_version}.parquet"
+    return [_write_partition(pa.concat_tables(tables), month, name, root) for month, tables in by_month.items()]
+
+
+def _dataset(root: Optional[str]) -> Optional[ds.Dataset]:
+    base = _root(root)
+    if not base.exists() or not any(base.glob("month=*/*.parquet")):
+        return None
+    return ds.dataset(
+        str(base),
+        format="parquet",
+        schema=DATASET_SCHEMA,
+        partitioning=PARTITIONING,
+        exclude_invalid_files=False,
+        ignore_prefixes=[".", "_"],
+    )
+
+
+def _as_list(value: Filter) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [value]
+    return [v for v in value if v]
+
+
+def build_filter(
+    supplier: Filter = None,
+    category: Filter = None,
+    start: Optional[DateLike] = None,
+    end: Optional[DateLike] = None,
+    factor_version: Filter = None,
+) -> Optional[ds.Expression]:
+    """
+    Translate query arguments into a dataset expression.
+    Date bounds also constrain the month partition key so non-matching directories are never opened.
+    """
+    expr: Optional[ds.Expression] = None
+
+    def _and(clause: ds.Expression) -> None:
+        nonlocal expr
+        expr = clause if expr is None else expr & clause
+
+    for column, value in (("supplier", supplier), ("category", category), ("factor_version", factor_version)):
+        values = _as_list(value)
+        if values:
+            _and(ds.field(column).isin(values))
+
+    if start is not None:
+        start_ts = _to_datetime(start)
+        _and(ds.field("month") >= _month(start_ts))
+        _and(ds.field("analyzed_at") >= pa.scalar(start_ts, type=HISTORY_SCHEMA.field("analyzed_at").type))
+    if end is not None:
+        end_ts = _to_datetime(end, end=True)
+        _and(ds.field("month") <= _month(end_ts))
+        _and(ds.field("analyzed_at") < pa.scalar(end_ts, type=HISTORY_SCHEMA.field("analyzed_at").type))
+
+    return expr
+
+
+def _columns(columns: Optional[Sequence[str]]) -> Optional[List[str]]:
+    if not columns:
+        return None
+    unknown = [c for c in columns if c not in DATASET_SCHEMA.names]
+    if unknown:
+        raise ValueError(f"Unknown history column(s): {', '.join(unknown)}")
+    return list(columns)
+
+
+def _schema(columns: Optional[List[str]]) -> pa.Schema:
+    if columns is None:
+        return DATASET_SCHEMA
+    return pa.schema([DATASET_SCHEMA.field(c) for c in columns])
+
+
+def _recorded(table: pa.Table) -> pa.ChunkedArray:
+    return pc.coalesce(table["recorded_at"], table["analyzed_at"])
+
+
+def _latest_keys(
+    dataset: ds.Dataset,
+    start: Optional[DateLike],
+    end: Optional[DateLike],
+    factor_version: Filter,
+) -> Optional[pa.Table]:
+    """
+    Return (invoice_id, _recorded) for each invoice's latest write, or None when no invoice was written twice.
+    Supplier/category filters are deliberately not applied, so a corrected supplier name cannot
+    resurface an invoice's superseded rows.
+    """
+    keys = dataset.to_table(columns=LATEST_KEY_COLUMNS, filter=build_filter(None, None, start, end, factor_version))
+    keys = pa.table({"invoice_id": keys["invoice_id"], "_recorded": _recorded(keys)})
+    latest = keys.group_by("invoice_id").aggregate([("_recorded", "max")]).rename_columns(["invoice_id", "_recorded"])
+    writes = keys.group_by(["invoice_id", "_recorded"]).aggregate([])
+    return latest if writes.num_rows > latest.num_rows else None
+
+
+def _scan(
+    root: Optional[str],
+    columns: Optional[List[str]],
+    supplier: Filter,
+    category: Filter,
+    start: Optional[DateLike],
+    end: Optional[DateLike],
+    factor_version: Filter,
+    latest: bool,
+) -> Iterator[pa.Table]:
+    """
+    Yield the matching rows batch by batch, restricted to each invoice's latest write when `latest` is set.
+    The store is locked against compaction swaps from file discovery until the last batch.
+    """
+    if not _root(root).exists():
+        return
+    with _flock(_root(root) / STORE_LOCK, exclusive=False):
+        dataset = _dataset(root)
+        if dataset is None:
+            return
+        expr = build_filter(supplier, category, start, end, factor_version)
+        latest_keys = _latest_keys(dataset, start, end, factor_version) if latest else None
+        if latest_keys is None:
+            for batch in dataset.to_batches(columns=columns, filter=expr):
+                yield pa.Table.from_batches([batch])
+            return
+
+        wanted = columns or DATASET_SCHEMA.names
+        read = wanted + [c for c in LATEST_KEY_COLUMNS if c not in wanted]
+        for batch in dataset.to_batches(columns=read, filter=expr):
+            table = pa.Table.from_batches([batch])
+            table = table.append_column("_recorded", _recorded(table))
+            table = table.join(latest_keys, keys=["invoice_id", "_recorded"], join_type="left semi")
+            yield table.select(wanted)
+
+
+def query_items(
+    supplier: Filter = None,
+    category: Filter = None,
+    start: Optional[DateLike] = None,
+    end: Optional[DateLike] = None,
+    factor_version: Filter = None,
+    columns: Optional[Sequence[str]] = None,
+    limit: Optional[int] = None,
+    root: Optional[str] = None,
+    latest: bool = True,
+) -> pa.Table:
+    """
+    Load line items from the history store.
+    Filters are pushed down to the Parquet scan and only the requested columns are read.
+    By default only each invoice's latest write is returned, so recomputed invoices are not
+    counted twice; pass latest=False for every factor version ever recorded.
+    """
+    columns = _columns(columns)
+    tables = []
+    rows = 0
+    # closing() releases the scan's lock right away when the limit stops it early.
+    with closing(_scan(root, columns, supplier, category, start, end, factor_version, latest)) as scan:
+        for table in scan:
+            tables.append(table)
+            rows += table.num_rows
+            if limit is not None and rows >= limit:
+                break
+    result = pa.concat_tables(tables) if tables else _schema(columns).empty_table()
+    return result if limit is None else result.slice(0, limit)
+
+
+def iter_csv(
+    supplier: Filter = None,
+    category: Filter = None,
+    start: Optional[DateLike] = None,
+    end: Optional[DateLike] = None,
+    factor_version: Filter = None,
+    columns: Optional[Sequence[str]] = None,
+    root: Optional[str] = None,
+    latest: bool = True,
+) -> Iterator[bytes]:
+    """
+    Stream matching items as CSV, one record batch at a time, so large exports stay out of memory.
+    """
+    columns = _columns(columns)
+    schema = _schema(columns)
+    sink = io.BytesIO()
+    writer = pa_csv.CSVWriter(sink, schema)
+
+    def _drain() -> bytes:
+        chunk = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return chunk
+
+    with closing(_scan(root, columns, supplier, category, start, end, factor_version, latest)) as scan:
+        for table in scan:
+            writer.write_table(table)
+            yield _drain()
+    writer.close()
+    tail = _drain()
+    if tail:
+        yield tail
+
+
+def write_parquet(
+    target: Union[str, Path],
+    supplier: Filter = None,
+    category: Filter = None,
+    start: Optional[DateLike] = None,
+    end: Optional[DateLike] = None,
+    factor_version: Filter = None,
+    columns: Optional[Sequence[str]] = None,
+    root: Optional[str] = None,
+    latest: bool = True,
+) -> Path:
+    """
+    Write matching items to a single Parquet file, batch by batch.
+    """
+    columns = _columns(columns)
+    schema = _schema(columns)
+    target = Path(target)
+    with pq.ParquetWriter(target, schema) as writer:
+        for table in _scan(root, columns, supplier, category, start, end, factor_version, latest):
+            writer.write_table(table)
+    return target
+
+
+def compact_month(month: str, root: Optional[str] = None, min_files: int = 2) -> Optional[Path]:
+    """
+    Merge the per-analysis files of one month partition into a single file.
+    Fewer, larger files keep full-history scans fast once many invoices have been analyzed.
+    Files appended while compaction runs are left in place for the next pass. Returns None when there is
+    nothing to merge or another compaction of the same month is already running.
+    """
+    partition = _root(root) / f"month={month}"
+    if not partition.is_dir():
+        return None
+    with _flock(partition / COMPACT_LOCK, exclusive=True, blocking=False) as acquired:
+        if not acquired:
+            return None
+        files = sorted(partition.glob("*.parquet"))
+        if len(files) < max(2, min_files):
+            return None
+
+        table = ds.dataset([str(f) for f in files], format="parquet", schema=HISTORY_SCHEMA).to_table()
+        # Clustering by the common filter columns gives row groups tight min/max stats to skip on.
+        table = table.sort_by([("supplier", "ascending"), ("category", "ascending"), ("analyzed_at", "ascending")])
+        target = partition / f"part-{uuid.uuid4().hex}.parquet"
+        tmp = partition / f".{target.name}.tmp"
+        pq.write_table(table, tmp, row_group_size=256_000)
+        # Swap under the store lock so no scan sees both the merged file and its inputs.
+        with _flock(_root(root) / STORE_LOCK, exclusive=True):
+            os.replace(tmp, target)
+            for f in files:
+                f.unlink(missing_ok=True)
+        return target
+
+
+def list_months(root: Optional[str] = None) -> List[str]:
+    base = _root(root)
+    if not base.exists():
+        return []
+    return sorted(p.name.split("=", 1)[1] for p in base.glob("month=*") if p.is_dir())
+
+
+def compact(
+    months: Optional[Iterable[str]] = None, root: Optional[str] = None, min_files: int = 2
+) -> Dict[str, int]:
+    """
+    Compact the given month partitions (default: all of them) that hold at least `min_files` files.
+    Returns the number of files merged per compacted month.
+    """
+    merged: Dict[str, int] = {}
+    for month in months or list_months(root):
+        count = len(list((_root(root) / f"month={month}").glob("*.parquet")))
+        if compact_month(month, root, min_files) is not None:
+            merged[month] = count
+    return merged
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Maintain the line-item history store.")
+    parser.add_argument("--compact", nargs="*", metavar="MONTH", help="Compact these months (YYYY-MM; default: all).")
+    parser.add_argument("--min-files", type=int, default=2, help="Skip months with fewer files (default: 2).")
+    parser.add_argument("--root", default=None, help="History directory (default: SCOPE3_HISTORY_DIR).")
+    args = parser.parse_args(argv)
+    if args.compact is None:
+        parser.print_help()
+        return 1
+
+    started = time.perf_counter()
+    merged = compact(args.compact, args.root, args.min_files)
+    for month, count in merged.items():
+        print(f"[history] month={month} merged {count} files")
+    print(f"[history] Compacted {len(merged)} month(s) in {time.perf_counter() - started:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,271 @@
+"""
+Headless bulk ingestion for invoice archives.
+
+Usage:
+    python -m src.ingest PATH [PATH ...] --workers 4 --checkpoint ingest_checkpoint.jsonl --report ingest_report.json
+
+PATH can be a directory tree or a .zip archive (zips found inside a directory are expanded too).
+Progress is appended to the checkpoint file as each file finishes, so rerunning the same command
+after an interruption skips everything already analyzed. Files are identified by content hash,
+so duplicates and renamed copies are only processed once.
+
+Analyses must go to durable storage: set SCOPE3_STORAGE_DIR (or pass --storage-dir). A file is
+only checkpointed once its analysis has been written there.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from .history import compact
+from . import storage
+from .pipeline import analyze_content
+from .storage import save_analysis
+
+SUPPORTED_SUFFIXES = {".pdf", ".png", ".jpg", ".jpeg", ".tiff", ".bmp", ".txt"}
+
+
+def iter_sources(paths: List[str]) -> Iterator[Tuple[str, str, bytes]]:
+    """
+    Yield (source, filename, content) for every supported file under the given paths.
+    Sources are stable labels (file path, or archive path + member name) used in reports.
+    """
+    for raw in paths:
+        path = Path(raw)
+        if path.is_dir():
+            for child in sorted(path.rglob("*")):
+                if child.is_file():
+                    yield from _iter_file(child)
+        elif path.is_file():
+            yield from _iter_file(path)
+        else:
+            print(f"[ingest] Skipping missing path: {path}")
+
+
+def _iter_file(path: Path) -> Iterator[Tuple[str, str, bytes]]:
+    suffix = path.suffix.lower()
+    if suffix == ".zip":
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                name = Path(info.filename)
+                if info.is_dir() or name.suffix.lower() not in SUPPORTED_SUFFIXES:
+                    continue
+                yield f"{path}!{info.filename}", name.name, archive.read(info)
+    elif suffix in SUPPORTED_SUFFIXES:
+        yield str(path), path.name, path.read_bytes()
+
+
+def load_checkpoint(path: Path) -> Set[str]:
+    """Return the content hashes that were already analyzed successfully."""
+    done: Set[str] = set()
+    if not path.exists():
+        return done
+    for line in path.read_text(encoding="utf-8").splitlines():
+        try:
+            entry = json.loads(line)
+        except json.JSONDecodeError:
+            continue  # a run killed mid-write can leave a truncated last line
+        if entry.get("status") == "ok":
+            done.add(entry["sha256"])
+    return done
+
+
+class Checkpoint:
+    """Append-only JSONL log of finished files, flushed after every entry."""
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._fh = path.open("a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def record(self, entry: Dict) -> None:
+        with self._lock:
+            self._fh.write(json.dumps(entry) + "\n")
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+
+    def close(self) -> None:
+        self._fh.close()
+
+
+def _process(source: str, filename: str, content: bytes, digest: str) -> Dict:
+    started = time.perf_counter()
+    try:
+        analysis, parsed = analyze_content(content, filename)
+        # Durable (fsynced) before the result is returned and checkpointed.
+        save_analysis(analysis["invoice_id"], analysis, parsed)
+        return {
+            "sha256": digest,
+            "source": source,
+            "status": "ok",
+            "invoice_id": analysis["invoice_id"],
+            # History partition the items were appended to, so only those months get compacted.
+            "month": analysis["analyzed_at"][:7],
+            "items": len(analysis.get("items", [])),
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+    except Exception as exc:
+        return {
+            "sha256": digest,
+            "source": source,
+            "status": "failed",
+            "error": f"{type(exc).__name__}: {exc}",
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+
+
+def ingest(
+    paths: List[str],
+    workers: int = 4,
+    checkpoint_path: str = "ingest_checkpoint.jsonl",
+    report_path: Optional[str] = "ingest_report.json",
+    compact_history: bool = True,
+) -> Dict:
+    """
+    Stream every invoice under `paths` through the pipeline and return the run report.
+    Unless disabled, the history months written to are compacted at the end of the run.
+    """
+    if not storage.is_durable():
+        raise RuntimeError("Bulk ingestion needs durable storage: set SCOPE3_STORAGE_DIR (or --storage-dir).")
+
+    checkpoint_file = Path(checkpoint_path)
+    done = load_checkpoint(checkpoint_file)
+    checkpoint = Checkpoint(checkpoint_file)
+
+    started_at = datetime.now(timezone.utc)
+    clock = time.perf_counter()
+    seen: Set[str] = set()
+    stats = {"files_seen": 0, "processed": 0, "skipped": 0, "duplicates": 0, "failed": 0, "items": 0, "bytes": 0}
+    failures: List[Dict] = []
+    months: Set[str] = set()
+    interrupted = False
+
+    def _collect(future: Future) -> None:
+        # A future leaves `pending` only once its result is checkpointed, so an interrupt at any point
+        # (even while blocked on result()) still gets it collected below.
+        result = future.result()
+        checkpoint.record(result)
+        pending.discard(future)
+        if result["status"] == "ok":
+            stats["processed"] += 1
+            stats["items"] += result["items"]
+            months.add(result["month"])
+        else:
+            stats["failed"] += 1
+            failures.append({"source": result["source"], "error": result["error"]})
+            print(f"[ingest] Failed {result['source']}: {result['error']}")
+
+    # Keep only a bounded number of files in flight so huge archives are not loaded into memory at once.
+    max_in_flight = max(1, workers) * 2
+    pending: Set[Future] = set()
+    executor = ThreadPoolExecutor(max_workers=max(1, workers))
+    try:
+        for source, filename, content in iter_sources(paths):
+            stats["files_seen"] += 1
+            digest = hashlib.sha256(content).hexdigest()
+            if digest in done:
+                stats["skipped"] += 1
+                continue
+            if digest in seen:
+                stats["duplicates"] += 1
+                continue
+            seen.add(digest)
+            stats["bytes"] += len(content)
+
+            pending.add(executor.submit(_process, source, filename, content, digest))
+            if len(pending) >= max_in_flight:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    _collect(future)
+
+        for future in list(pending):
+            _collect(future)
+    except KeyboardInterrupt:
+        interrupted = True
+        print("[ingest] Interrupted; finishing files already running, rerun to resume.")
+        for future in pending:
+            future.cancel()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        try:
+            # Files that were running when interrupted are saved by now; checkpoint them so a rerun
+            # does not analyze them again under new invoice ids.
+            for future in list(pending):
+                if future.done() and not future.cancelled():
+                    _collect(future)
+        finally:
+            checkpoint.close()
+
+    compacted: Dict[str, int] = {}
+    if compact_history and months:
+        try:
+            compacted = compact(sorted(months))
+        except Exception as exc:  # history is best-effort, as in run_pipeline
+            print(f"[ingest] History compaction failed: {exc}")
+
+    elapsed = time.perf_counter() - clock
+    report = {
+        "started_at": started_at.isoformat(),
+        "finished_at": datetime.now(timezone.utc).isoformat(),
+        "interrupted": interrupted,
+        "workers": workers,
+        "elapsed_s": round(elapsed, 3),
+        **stats,
+        "files_per_s": round(stats["processed"] / elapsed, 3) if elapsed else 0.0,
+        "items_per_s": round(stats["items"] / elapsed, 3) if elapsed else 0.0,
+        "compacted_months": sorted(compacted),
+        "failures": failures,
+    }
+    if report_path:
+        Path(report_path).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk-ingest a directory tree or zip archive of invoices.")
+    parser.add_argument("paths", nargs="+", help="Directories, zip archives, or individual invoice files.")
+    parser.add_argument("--workers", type=int, default=4, help="Files analyzed concurrently (default: 4).")
+    parser.add_argument(
+        "--checkpoint",
+        default="ingest_checkpoint.jsonl",
+        help="Progress log used to resume interrupted runs (default: ingest_checkpoint.jsonl).",
+    )
+    parser.add_argument("--report", default="ingest_report.json", help="Where to write the run report JSON.")
+    parser.add_argument(
+        "--storage-dir",
+        default=os.getenv("SCOPE3_STORAGE_DIR"),
+        help="Directory analyses are written to (default: SCOPE3_STORAGE_DIR; required).",
+    )
+    parser.add_argument(
+        "--no-compact", action="store_true", help="Skip compacting the history months written by this run."
+    )
+    args = parser.parse_args(argv)
+    if not args.storage_dir:
+        parser.error("analyses would only be kept in memory; set SCOPE3_STORAGE_DIR or pass --storage-dir")
+    storage.STORAGE_DIR = args.storage_dir
+
+    report = ingest(
+        args.paths,
+        workers=args.workers,
+        checkpoint_path=args.checkpoint,
+        report_path=args.report,
+        compact_history=not args.no_compact,
+    )
+    print(
+        f"[ingest] processed={report['processed']} skipped={report['skipped']} "
+        f"duplicates={report['duplicates']} failed={report['failed']} "
+        f"elapsed={report['elapsed_s']}s files/s={report['files_per_s']}"
+    )
+    return 1 if report["failed"] or report["interrupted"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -91,6 +91,11 @@ def _normalize_item(entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     if category:
         normalized["category"] = str(category)
 
+    for key in ("sector_code", "product_code"):
+        code = entry.get(key)
+        if code not in (None, ""):
+            normalized[key] = str(code).strip()
+
     return normalized
 
 
@@ -109,6 +114,8 @@ def extract_invoice_items(invoice_text: str) -> List[Dict]:
         "- weight_tons (number or null, metric tons)\n"
         "- distance_km (number or null, kilometers for transport legs)\n"
         "- category (steel, transport, packaging, other if clear)\n"
+        "- sector_code (NAICS code if stated on the invoice, else null)\n"
+        "- product_code (HS/commodity code if stated on the invoice, else null)\n"
         "Use numeric values only; strip currency symbols. If supplier is missing, reuse the last "
         "supplier or 'Unknown Supplier'. Do not hallucinate items not in the text. Respond with JSON only.\n\n"
         f"INVOICE TEXT:\n{invoice_text}"
@@ -1,13 +1,17 @@
 import io
 import uuid
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict
+from typing import Dict, List, Tuple
 
 from .aggregate import build_analysis
 from .emissions import compute_emissions
-from .factors import load_factors
+from .factors import factor_version, load_factors
+from .history import append_items
 from .ocr import extract_text
 from .parser import parse_invoice_text
+from .sector_index import load_sector_index
+from .suppliers import resolve_suppliers
 
 
 def run_pipeline(file_path: str) -> Dict:
@@ -15,13 +19,37 @@ def run_pipeline(file_path: str) -> Dict:
     Run OCR, parse, categorize, calculate emissions, and return standardized analysis JSON.
     """
     path = Path(file_path)
-    invoice_id = f"INV-{uuid.uuid4()}"
+    return run_pipeline_content(path.read_bytes(), path.name)
+
+
+def run_pipeline_content(content: bytes, filename: str) -> Dict:
+    """
+    Same as run_pipeline, for invoice bytes that are already in memory (uploads, archive members).
+    """
+    return analyze_content(content, filename)[0]
 
-    content = path.read_bytes()
-    text = extract_text(io.BytesIO(content), filename=path.name)
+
+def analyze_content(content: bytes, filename: str) -> Tuple[Dict, List[Dict]]:
+    """
+    Run the pipeline and also return the parsed, pre-emissions items, for callers that store the
+    analysis: pass both to save_analysis so the invoice can be recomputed later.
+    """
+    invoice_id = f"INV-{uuid.uuid4()}"
+    text = extract_text(io.BytesIO(content), filename=filename)
+    parsed = parse_invoice_text(text)
 
     factors = load_factors()
-    items = [compute_emissions(item, factors) for item in parse_invoice_text(text)]
+    sectors = load_sector_index()
+    items = [compute_emissions(item, factors, sectors) for item in resolve_suppliers(parsed)]
 
+    analyzed_at = datetime.now(timezone.utc)
     analysis = build_analysis(invoice_id, items)
-    return analysis
+    analysis["analyzed_at"] = analyzed_at.isoformat()
+    analysis["factor_version"] = factor_version(factors, sectors)
+
+    try:
+        append_items(invoice_id, items, analyzed_at, analysis["factor_version"])
+    except Exception as exc:  # history is best-effort; never fail the analysis because of it
+        print(f"[run_pipeline] Failed to record items in history store: {exc}")
+
+    return analysis, parsed
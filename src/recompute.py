@@ -0,0 +1,253 @@
+"""
+Re-price stored analyses against a new factor set without repeating OCR or LLM extraction.
+
+Usage:
+    python -m src.recompute --factors data/emission_factors.json [--invoice ID ...] [--supplier NAME ...]
+                            [--from-version FACTOR_VERSION ...] [--sectors DIR] [--workers 4]
+
+Analyses are read from storage (set SCOPE3_STORAGE_DIR so CLI runs see the server's analyses).
+An analysis is skipped only when it already uses this factor set and its suppliers still resolve to the
+same canonical names, so rerunning with unchanged factors applies supplier alias corrections.
+Each recomputed analysis is saved as a new version and its items are appended to the history store,
+where they supersede the invoice's earlier rows in default (latest-only) history queries.
+"""
+import argparse
+import itertools
+import sys
+import time
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from .aggregate import build_analyses
+from .emissions import compute_emissions_frame
+from .factors import factor_version, load_factors
+from .history import append_batch
+from .sector_index import SectorIndex, load_sector_index
+from .storage import get_analysis, get_parsed_items, list_invoice_ids, save_analysis
+from .suppliers import UNKNOWN_SUPPLIER, get_registry, resolve_suppliers
+
+# Invoices handed to a worker at a time; large enough that vectorization and IPC overhead pay off.
+CHUNK_SIZE = 500
+
+
+def _recompute_chunk(
+    chunk: List[Tuple[str, List[Dict]]], factors: Dict[str, float], sectors: Optional[SectorIndex] = None
+) -> List[Tuple[str, Dict]]:
+    """
+    Compute emissions and analyses for every invoice in the chunk in single vectorized passes.
+    """
+    rows = [dict(item, invoice_id=invoice_id) for invoice_id, items in chunk for item in items]
+    enriched = compute_emissions_frame(pd.DataFrame(rows), factors, sectors) if rows else pd.DataFrame()
+
+    # Build each item from the parsed dict plus the computed fields, exactly as compute_emissions does,
+    # so ints stay ints and absent/None fields keep their original shape.
+    categories = enriched["category"].tolist() if rows else []
+    sector_codes = enriched["sector"].tolist() if "sector" in enriched else [None] * len(rows)
+    emissions = enriched["emissions_kg"].tolist() if rows else []
+    items_by_invoice: Dict[str, List[Dict]] = {}
+    for row, category, sector, emissions_kg in zip(rows, categories, sector_codes, emissions):
+        item = dict(row)
+        invoice_id = item.pop("invoice_id")
+        item["category"] = category
+        if isinstance(sector, str):
+            item["sector"] = sector
+        item["emissions_kg"] = emissions_kg
+        items_by_invoice.setdefault(invoice_id, []).append(item)
+
+    invoice_ids = [invoice_id for invoice_id, _ in chunk]
+    analyses = build_analyses(enriched, invoice_ids, items_by_invoice)
+    return [(invoice_id, analyses[invoice_id]) for invoice_id in invoice_ids]
+
+
+def select_invoices(
+    invoice_ids: Optional[Iterable[str]] = None,
+    supplier: Optional[Iterable[str]] = None,
+    from_version: Optional[Iterable[str]] = None,
+) -> Iterator[Tuple[str, Dict]]:
+    """
+    Pick stored analyses to recompute, yielding (invoice_id, current analysis) lazily.
+    Each analysis is read once here and handed on. With no filters, every stored analysis is selected.
+    """
+    candidates = list(invoice_ids) if invoice_ids else list_invoice_ids()
+    suppliers = set(supplier or [])
+    versions = set(from_version or [])
+    registry = get_registry() if suppliers else None
+
+    for invoice_id in candidates:
+        current = get_analysis(invoice_id)
+        if not current:
+            continue  # never stored (or still being saved): nothing to recompute
+        if versions and current.get("factor_version") not in versions:
+            continue
+        if suppliers:
+            # lookup() never registers names, so selecting invoices leaves the supplier registry untouched.
+            parsed = get_parsed_items(invoice_id) or []
+            raw_names = {item.get("supplier_raw", item.get("supplier")) or UNKNOWN_SUPPLIER for item in parsed}
+            if not any(raw in suppliers or registry.lookup(raw) in suppliers for raw in raw_names):
+                continue
+        yield invoice_id, current
+
+
+def _iter_work(
+    selected: Iterable[Tuple[str, Dict]], version: str, report: Dict
+) -> Iterator[Tuple[List[Tuple[str, List[Dict]]], Dict[str, str]]]:
+    """
+    Yield chunks of (invoice_id, resolved parsed items) to recompute, with each invoice's original analyzed_at.
+    """
+    chunk: List[Tuple[str, List[Dict]]] = []
+    analyzed_at: Dict[str, str] = {}
+    for invoice_id, current in selected:
+        report["selected"] += 1
+        parsed = get_parsed_items(invoice_id)
+        if parsed is None:
+            report["missing_parsed"].append(invoice_id)
+            continue
+        # Re-resolve suppliers so registry corrections (POST /suppliers/aliases) made since the last run
+        # are picked up; an invoice is only unchanged if neither its factors nor its suppliers moved.
+        items = resolve_suppliers(parsed)
+        if current.get("factor_version") == version and [item["supplier"] for item in items] == [
+            item.get("supplier") for item in current.get("items", [])
+        ]:
+            report["unchanged"] += 1
+            continue
+        chunk.append((invoice_id, items))
+        if current.get("analyzed_at"):
+            analyzed_at[invoice_id] = current["analyzed_at"]
+        if len(chunk) >= CHUNK_SIZE:
+            yield chunk, analyzed_at
+            chunk, analyzed_at = [], {}
+    if chunk:
+        yield chunk, analyzed_at
+
+
+def _persist(
+    results: List[Tuple[str, Dict]], analyzed_at: Dict[str, str], version: str, recomputed_at: datetime, report: Dict
+) -> None:
+    """
+    Store one chunk: history rows first, then the new versions.
+    If the history write fails the versions are not saved, so a rerun picks the chunk up again;
+    a crash between the two steps at worst leaves history rows that the rerun supersedes.
+    """
+    for invoice_id, analysis in results:
+        # Keep the original analysis time so history date filters still refer to when the invoice came in.
+        analysis["analyzed_at"] = analyzed_at.get(invoice_id) or recomputed_at.isoformat()
+        analysis["recomputed_at"] = recomputed_at.isoformat()
+        analysis["factor_version"] = version
+
+    history_rows = [
+        (invoice_id, analysis["items"], datetime.fromisoformat(analysis["analyzed_at"]))
+        for invoice_id, analysis in results
+    ]
+    try:
+        append_batch(history_rows, version, recorded_at=recomputed_at)
+    except Exception as exc:
+        print(f"[recompute] Failed to record items in history store, skipping {len(results)} invoices: {exc}")
+        report["failed"] += len(results)
+        return
+
+    for invoice_id, analysis in results:
+        save_analysis(invoice_id, analysis)
+        report["items"] += len(analysis["items"])
+        report["recomputed"] += 1
+
+
+def recompute(
+    factors: Optional[Dict[str, float]] = None,
+    invoice_ids: Optional[Iterable[str]] = None,
+    supplier: Optional[Iterable[str]] = None,
+    from_version: Optional[Iterable[str]] = None,
+    workers: int = 4,
+    sectors: Optional[SectorIndex] = None,
+) -> Dict:
+    """
+    Recompute emissions and analyses for the selected invoices and store them as new versions.
+    Without an explicit sector table the configured one (SCOPE3_SECTOR_TABLE, if set) is used, as in run_pipeline.
+    Work is processed and persisted chunk by chunk, so memory stays bounded and every saved
+    version already has its history rows. Returns a run report.
+    """
+    started = time.perf_counter()
+    factors = factors or load_factors()
+    if sectors is None:
+        sectors = load_sector_index()
+    version = factor_version(factors, sectors)
+    recomputed_at = datetime.now(timezone.utc)
+
+    report = {
+        "factor_version": version,
+        "selected": 0,
+        "recomputed": 0,
+        "unchanged": 0,
+        "failed": 0,
+        "items": 0,
+        "missing_parsed": [],
+    }
+    work = _iter_work(select_invoices(invoice_ids, supplier, from_version), version, report)
+
+    if workers <= 1:
+        for chunk, analyzed_at in work:
+            _persist(_recompute_chunk(chunk, factors, sectors), analyzed_at, version, recomputed_at, report)
+    else:
+        # Start the pool only once there is more than one chunk, and keep a bounded number in flight.
+        first = next(work, None)
+        second = next(work, None)
+        if second is None:
+            if first is not None:
+                chunk, analyzed_at = first
+                _persist(_recompute_chunk(chunk, factors, sectors), analyzed_at, version, recomputed_at, report)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                pending: Dict[Future, Dict[str, str]] = {}
+
+                def _drain(return_when: str) -> None:
+                    finished, _ = wait(pending, return_when=return_when)
+                    for future in finished:
+                        _persist(future.result(), pending.pop(future), version, recomputed_at, report)
+
+                for chunk, analyzed_at in itertools.chain([first, second], work):
+                    pending[pool.submit(_recompute_chunk, chunk, factors, sectors)] = analyzed_at
+                    if len(pending) >= workers * 2:
+                        _drain(FIRST_COMPLETED)
+                if pending:
+                    _drain(ALL_COMPLETED)
+
+    elapsed = time.perf_counter() - started
+    report["elapsed_s"] = round(elapsed, 3)
+    report["items_per_s"] = round(report["items"] / elapsed, 3) if elapsed else 0.0
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Recompute stored analyses against a factor set.")
+    parser.add_argument("--factors", default="data/emission_factors.json", help="Factor JSON to apply.")
+    parser.add_argument("--invoice", action="append", help="Only recompute this invoice_id (repeatable).")
+    parser.add_argument("--supplier", action="append", help="Only invoices with items from this supplier (repeatable).")
+    parser.add_argument(
+        "--from-version", action="append", help="Only analyses currently at this factor_version (repeatable)."
+    )
+    parser.add_argument(
+        "--sectors", default=None, help="Spend-based sector table directory (default: SCOPE3_SECTOR_TABLE, none if unset)."
+    )
+    parser.add_argument("--workers", type=int, default=4, help="Worker processes (default: 4).")
+    args = parser.parse_args(argv)
+
+    report = recompute(
+        factors=load_factors(args.factors),
+        invoice_ids=args.invoice,
+        supplier=args.supplier,
+        from_version=args.from_version,
+        workers=args.workers,
+        sectors=load_sector_index(args.sectors),
+    )
+    print(
+        f"[recompute] factor_version={report['factor_version']} selected={report['selected']} "
+        f"recomputed={report['recomputed']} unchanged={report['unchanged']} failed={report['failed']} "
+        f"missing_parsed={len(report['missing_parsed'])} items={report['items']} elapsed={report['elapsed_s']}s"
+    )
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
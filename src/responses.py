@@ -0,0 +1,124 @@
+import gzip
+import hashlib
+import json
+from typing import Any, Dict, List, Optional
+
+from fastapi import Request, Response
+
+try:
+    import orjson
+except Exception:  # pragma: no cover - optional dependency at runtime
+    orjson = None
+
+try:
+    import brotli
+except Exception:  # pragma: no cover - optional dependency at runtime
+    brotli = None
+
+# Bodies smaller than this are sent uncompressed; the framing overhead is not worth it.
+COMPRESS_MIN_BYTES = 1024
+
+SUMMARY_FIELDS = ["invoice_id", "version", "analyzed_at", "recomputed_at", "factor_version", "summary", "hotspots"]
+
+VIEWS = {
+    "summary": SUMMARY_FIELDS,
+    "no_items": SUMMARY_FIELDS + ["by_supplier", "by_category"],
+}
+
+ANALYSIS_FIELDS = VIEWS["no_items"] + ["items"]
+
+# Conditional requests (If-None-Match -> 304) only make sense for safe methods.
+CONDITIONAL_METHODS = {"GET", "HEAD"}
+
+
+def dumps(payload: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def project_analysis(
+    analysis: Dict,
+    view: str = "full",
+    fields: Optional[List[str]] = None,
+    items_offset: int = 0,
+    items_limit: Optional[int] = None,
+) -> Dict:
+    """
+    Return only the requested parts of an analysis.
+    `fields` wins over `view`; when items are included they can be paged with offset/limit.
+    """
+    if fields:
+        unknown = [key for key in fields if key not in ANALYSIS_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown field(s): {', '.join(unknown)}. Use any of: {', '.join(ANALYSIS_FIELDS)}.")
+        keys = fields
+    elif view in VIEWS:
+        keys = VIEWS[view]
+    elif view == "full":
+        keys = list(analysis.keys())
+    else:
+        raise ValueError(f"Unknown view '{view}'. Use one of: full, {', '.join(VIEWS)}.")
+
+    projected = {key: analysis[key] for key in keys if key in analysis}
+    if "items" in projected:
+        items = projected["items"]
+        end = None if items_limit is None else items_offset + items_limit
+        projected["items"] = items[items_offset:end]
+        projected["items_page"] = {"offset": items_offset, "limit": items_limit, "total": len(items)}
+    return projected
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison: ignore W/ prefixes on both sides.
+    wanted = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == wanted for tag in if_none_match.split(","))
+
+
+def _accepted_encodings(header: str) -> Dict[str, float]:
+    accepted: Dict[str, float] = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    return accepted
+
+
+def json_response(request: Request, payload: Any, status_code: int = 200) -> Response:
+    """
+    Serialize with the fast encoder, answer conditional GET/HEAD requests with 304, and compress large bodies.
+    """
+    body = dumps(payload)
+    # Weak ETag over the uncompressed body so gzip/br/identity variants share one validator.
+    etag = f'W/"{hashlib.sha256(body).hexdigest()[:32]}"'
+    headers = {"ETag": etag, "Vary": "Accept-Encoding"}
+
+    if (
+        status_code == 200
+        and request.method in CONDITIONAL_METHODS
+        and _etag_matches(request.headers.get("if-none-match"), etag)
+    ):
+        return Response(status_code=304, headers=headers)
+
+    if len(body) >= COMPRESS_MIN_BYTES:
+        accepted = _accepted_encodings(request.headers.get("accept-encoding", ""))
+        if brotli is not None and accepted.get("br", 0) > 0:
+            body = brotli.compress(body, quality=4)
+            headers["Content-Encoding"] = "br"
+        elif accepted.get("gzip", 0) > 0:
+            body = gzip.compress(body, compresslevel=5)
+            headers["Content-Encoding"] = "gzip"
+
+    return Response(content=body, status_code=status_code, media_type="application/json", headers=headers)
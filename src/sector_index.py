@@ -0,0 +1,273 @@
+"""
+Spend-based emission factors for fine-grained sectors.
+
+The table lives in a directory with two CSV files:
+- sectors.csv: code, name, kg_co2e_per_usd
+- mappings.csv: type (keyword|code), value, code
+  keyword rows map description words/phrases to a sector; code rows map product codes (e.g. HS
+  chapters) to a sector. Codes match on their longest known prefix.
+
+The CSVs are compiled once into a SectorIndex (plain dicts keyed by keyword and code), which is
+pickled next to the table and reused until the CSVs change. Resolving an item is a handful of dict
+lookups, independent of how many sectors or mappings the table holds.
+
+The table is opt-in: items fall back to other_per_usd unless SCOPE3_SECTOR_TABLE (or an explicit
+path) points at one. data/spend_factors is an illustrative sample, not a licensed dataset.
+
+Benchmark: python -m src.sector_index --table data/spend_factors --bench 100000
+"""
+import argparse
+import csv
+import hashlib
+import os
+import pickle
+import random
+import re
+import sys
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+SECTOR_TABLE_DIR = os.getenv("SCOPE3_SECTOR_TABLE")
+CACHE_NAME = ".sector_index.pkl"
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+# Shortest prefix tried when matching hierarchical codes (NAICS, HS, ...).
+MIN_CODE_PREFIX = 2
+
+
+class SectorIndex:
+    def __init__(
+        self,
+        codes: List[str],
+        names: List[str],
+        factors: List[float],
+        keywords: Dict[str, int],
+        product_codes: Dict[str, int],
+        fingerprint: str,
+    ):
+        self.codes = codes
+        self.names = names
+        self.factors = factors
+        self.keywords = keywords
+        self.product_codes = product_codes
+        self.sector_codes = {code: idx for idx, code in enumerate(codes)}
+        self.fingerprint = fingerprint
+        self.max_ngram = max((len(k.split()) for k in keywords), default=1)
+        self.max_code_len = max((len(c) for c in list(product_codes) + codes), default=0)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def _match_code(self, table: Dict[str, int], code: str) -> Optional[int]:
+        code = re.sub(r"[^0-9A-Za-z]", "", code)[: self.max_code_len]
+        for end in range(len(code), MIN_CODE_PREFIX - 1, -1):
+            idx = table.get(code[:end])
+            if idx is not None:
+                return idx
+        return None
+
+    def resolve(
+        self, description: str = "", sector_code: Optional[str] = None, product_code: Optional[str] = None
+    ) -> Optional[int]:
+        """
+        Return the sector row for an item, or None if nothing matches.
+        Explicit sector codes win, then product codes, then the longest keyword phrase in the description.
+        """
+        if sector_code:
+            idx = self._match_code(self.sector_codes, str(sector_code))
+            if idx is not None:
+                return idx
+        if product_code:
+            idx = self._match_code(self.product_codes, str(product_code))
+            if idx is not None:
+                return idx
+
+        tokens = _TOKEN_RE.findall((description or "").lower())
+        for size in range(min(self.max_ngram, len(tokens)), 0, -1):
+            for start in range(len(tokens) - size + 1):
+                idx = self.keywords.get(" ".join(tokens[start : start + size]))
+                if idx is not None:
+                    return idx
+        return None
+
+    def factor_for(
+        self, description: str = "", sector_code: Optional[str] = None, product_code: Optional[str] = None
+    ) -> Optional[Tuple[str, float]]:
+        idx = self.resolve(description, sector_code, product_code)
+        if idx is None:
+            return None
+        return self.codes[idx], self.factors[idx]
+
+
+def _normalize_keyword(value: str) -> str:
+    return " ".join(_TOKEN_RE.findall(value.lower()))
+
+
+def _content_fingerprint(folder: Path) -> str:
+    digest = hashlib.sha256()
+    for name in ("sectors.csv", "mappings.csv"):
+        path = folder / name
+        if path.exists():
+            digest.update(name.encode("utf-8"))
+            digest.update(path.read_bytes())
+    return digest.hexdigest()[:12]
+
+
+def _stat_signature(folder: Path) -> str:
+    # Cheap change detector (no file reads) used to decide whether the cached index is still valid.
+    parts = []
+    for name in ("sectors.csv", "mappings.csv"):
+        path = folder / name
+        if path.exists():
+            stat = path.stat()
+            parts.append(f"{name}:{stat.st_size}:{stat.st_mtime_ns}")
+    return "|".join(parts)
+
+
+def build_sector_index(folder: Path) -> SectorIndex:
+    """Parse the CSV table into a SectorIndex."""
+    codes: List[str] = []
+    names: List[str] = []
+    factors: List[float] = []
+    with (folder / "sectors.csv").open(newline="", encoding="utf-8") as fh:
+        for row in csv.DictReader(fh):
+            codes.append(row["code"].strip())
+            names.append(row["name"].strip())
+            factors.append(float(row["kg_co2e_per_usd"]))
+    by_code = {code: idx for idx, code in enumerate(codes)}
+
+    keywords: Dict[str, int] = {}
+    product_codes: Dict[str, int] = {}
+    mappings = folder / "mappings.csv"
+    if mappings.exists():
+        with mappings.open(newline="", encoding="utf-8") as fh:
+            for row in csv.DictReader(fh):
+                idx = by_code.get(row["code"].strip())
+                if idx is None:
+                    print(f"[sector_index] Mapping {row['value']!r} points to unknown sector {row['code']!r}")
+                    continue
+                if row["type"].strip() == "keyword":
+                    keyword = _normalize_keyword(row["value"])
+                    if keyword:
+                        keywords.setdefault(keyword, idx)
+                else:
+                    product_codes.setdefault(re.sub(r"[^0-9A-Za-z]", "", row["value"]), idx)
+
+    return SectorIndex(codes, names, factors, keywords, product_codes, _content_fingerprint(folder))
+
+
+@lru_cache(maxsize=4)
+def _load_cached(folder: str, signature: str) -> SectorIndex:
+    base = Path(folder)
+    cache = base / CACHE_NAME
+    if cache.exists():
+        try:
+            with cache.open("rb") as fh:
+                state = pickle.load(fh)
+            if state.pop("source") == signature:
+                return SectorIndex(**state)
+        except Exception:
+            pass  # stale or unreadable cache; rebuild below
+
+    index = build_sector_index(base)
+    # Pickle plain containers rather than the class so the cache survives module renames/reloads.
+    state = {
+        "codes": index.codes,
+        "names": index.names,
+        "factors": index.factors,
+        "keywords": index.keywords,
+        "product_codes": index.product_codes,
+        "fingerprint": index.fingerprint,
+        "source": signature,
+    }
+    try:
+        tmp = cache.with_name(f"{CACHE_NAME}.tmp")
+        with tmp.open("wb") as fh:
+            pickle.dump(state, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, cache)
+    except OSError as exc:
+        print(f"[sector_index] Could not write index cache: {exc}")
+    return index
+
+
+def load_sector_index(path: Optional[str] = None) -> Optional[SectorIndex]:
+    """
+    Return the compiled index for the table at `path` (default: SCOPE3_SECTOR_TABLE), or None when
+    no table is configured or found. Repeated calls return the same in-memory object until the CSVs change.
+    """
+    if not (path or SECTOR_TABLE_DIR):
+        return None
+    folder = Path(path or SECTOR_TABLE_DIR)
+    if not (folder / "sectors.csv").exists():
+        return None
+    return _load_cached(str(folder), _stat_signature(folder))
+
+
+def _write_synthetic_table(folder: Path, sectors: int, keywords: int, codes: int) -> None:
+    rng = random.Random(0)
+    folder.mkdir(parents=True, exist_ok=True)
+    with (folder / "sectors.csv").open("w", newline="", encoding="utf-8") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(["code", "name", "kg_co2e_per_usd"])
+        for i in range(sectors):
+            writer.writerow([f"S{i:04d}", f"Sector {i}", round(rng.uniform(0.05, 2.5), 3)])
+    with (folder / "mappings.csv").open("w", newline="", encoding="utf-8") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(["type", "value", "code"])
+        for i in range(keywords):
+            phrase = " ".join(f"kw{rng.randrange(10 * keywords)}" for _ in range(rng.choice([1, 1, 2, 3])))
+            writer.writerow(["keyword", phrase, f"S{rng.randrange(sectors):04d}"])
+        for i in range(codes):
+            writer.writerow(["code", f"{rng.randrange(10**6):06d}", f"S{rng.randrange(sectors):04d}"])
+
+
+def _bench(count: int, path: Optional[str]) -> bool:
+    started = time.perf_counter()
+    index = load_sector_index(path)
+    if index is None:
+        print("[sector_index] No sector table found.")
+        return False
+    print(
+        f"[sector_index] sectors={len(index)} keywords={len(index.keywords)} codes={len(index.product_codes)} "
+        f"load={1000 * (time.perf_counter() - started):.1f}ms"
+    )
+
+    rng = random.Random(0)
+    keywords = list(index.keywords)
+    filler = ["monthly", "invoice", "services", "batch", "order", "north", "plant", "q3", "net", "30"]
+    descriptions = []
+    for i in range(count):
+        words = rng.sample(filler, 4)
+        if i % 4:  # three in four items mention a known keyword somewhere
+            words.insert(rng.randrange(len(words)), rng.choice(keywords))
+        descriptions.append(" ".join(words))
+
+    started = time.perf_counter()
+    resolved = sum(1 for desc in descriptions if index.resolve(desc) is not None)
+    elapsed = time.perf_counter() - started
+    print(
+        f"[sector_index] items={count} resolved={resolved} total={elapsed:.3f}s "
+        f"per_item={1e6 * elapsed / count:.2f}us"
+    )
+    return True
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Inspect or benchmark the spend-based sector index.")
+    parser.add_argument("--table", default=None, help="Sector table directory (default: SCOPE3_SECTOR_TABLE).")
+    parser.add_argument("--bench", type=int, default=100_000, help="Number of synthetic items to resolve.")
+    parser.add_argument(
+        "--synthetic",
+        metavar="DIR",
+        help="Generate a large synthetic table (500 sectors, 5000 keywords, 2000 codes) in DIR and bench it.",
+    )
+    args = parser.parse_args(argv)
+    if args.synthetic:
+        _write_synthetic_table(Path(args.synthetic), sectors=500, keywords=5000, codes=2000)
+    return 0 if _bench(args.bench, args.synthetic or args.table) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
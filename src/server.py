@@ -1,14 +1,25 @@
 import tempfile
+import uuid
 from pathlib import Path
+from typing import Dict, List, Optional
 
-from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi import BackgroundTasks, FastAPI, File, HTTPException, Query, Request, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 
+from .factors import load_factors
+from .history import compact, iter_csv, query_items, write_parquet
 from .llm_client import LLMClientError, generate_reply
-from .pipeline import run_pipeline
+from .pipeline import analyze_content
 from .prompts import build_prompt
+from .recompute import recompute
+from .responses import json_response, project_analysis
+from .sector_index import load_sector_index
 from .storage import get_analysis, save_analysis
+from .suppliers import get_registry
+
+RECOMPUTE_JOBS: Dict[str, Dict] = {}
 
 app = FastAPI(title="Scope 3 Chat Integration")
 
@@ -22,19 +33,40 @@ app.add_middleware(
 
 
 @app.post("/analyze_invoice")
-async def analyze_invoice(file: UploadFile = File(...)):
+async def analyze_invoice(request: Request, file: UploadFile = File(...), view: str = "full"):
     if not file:
         raise HTTPException(status_code=400, detail="No file uploaded.")
 
-    suffix = Path(file.filename).suffix or ".bin"
-    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-        tmp.write(await file.read())
-        tmp_path = Path(tmp.name)
-
-    analysis = run_pipeline(str(tmp_path))
-    save_analysis(analysis["invoice_id"], analysis)
+    analysis, parsed = analyze_content(await file.read(), file.filename or "upload.bin")
+    save_analysis(analysis["invoice_id"], analysis, parsed)
     print(f"[analyze_invoice] invoice_id={analysis['invoice_id']}")
-    return {"invoice_id": analysis["invoice_id"], "analysis": analysis}
+    try:
+        projected = project_analysis(analysis, view=view)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return json_response(request, {"invoice_id": analysis["invoice_id"], "analysis": projected})
+
+
+@app.api_route("/analysis/{invoice_id}", methods=["GET", "HEAD"])
+def get_stored_analysis(
+    request: Request,
+    invoice_id: str,
+    view: str = "full",
+    fields: Optional[str] = None,
+    items_offset: int = Query(0, ge=0),
+    items_limit: Optional[int] = Query(None, ge=1, le=10_000),
+    version: Optional[int] = Query(None, ge=1),
+):
+    analysis = get_analysis(invoice_id, version)
+    if not analysis:
+        raise HTTPException(status_code=404, detail="Unknown invoice_id")
+
+    field_list = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    try:
+        projected = project_analysis(analysis, view, field_list, items_offset, items_limit)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return json_response(request, projected)
 
 
 @app.post("/chat")
@@ -61,6 +93,157 @@ async def chat(body: dict):
     return {"reply": reply}
 
 
+def _run_recompute_job(job_id: str, body: dict) -> None:
+    job = RECOMPUTE_JOBS[job_id]
+    job["status"] = "running"
+    try:
+        factors = body.get("factors") or load_factors(body.get("factors_path") or "data/emission_factors.json")
+        job["report"] = recompute(
+            factors=factors,
+            invoice_ids=body.get("invoice_ids"),
+            supplier=body.get("supplier"),
+            from_version=body.get("from_version"),
+            workers=int(body.get("workers") or 4),
+            sectors=load_sector_index(body.get("sectors_path")),
+        )
+        job["status"] = "done"
+    except Exception as exc:
+        job["status"] = "failed"
+        job["error"] = str(exc)
+    print(f"[recompute] job_id={job_id} status={job['status']}")
+
+
+@app.post("/recompute", status_code=202)
+def start_recompute(body: dict, background_tasks: BackgroundTasks):
+    """
+    Re-price stored analyses with a new factor set. Body fields are all optional:
+    factors (inline dict) or factors_path, sectors_path, invoice_ids, supplier, from_version (lists), workers.
+    """
+    job_id = f"RC-{uuid.uuid4()}"
+    RECOMPUTE_JOBS[job_id] = {"job_id": job_id, "status": "queued"}
+    background_tasks.add_task(_run_recompute_job, job_id, body)
+    return RECOMPUTE_JOBS[job_id]
+
+
+@app.get("/recompute/{job_id}")
+def recompute_status(job_id: str):
+    job = RECOMPUTE_JOBS.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Unknown job_id")
+    return job
+
+
+def _history_filters(
+    supplier: Optional[List[str]],
+    category: Optional[List[str]],
+    start: Optional[str],
+    end: Optional[str],
+    factor_version: Optional[List[str]],
+    columns: Optional[str],
+    all_versions: bool = False,
+) -> dict:
+    return {
+        "supplier": supplier,
+        "category": category,
+        "start": start,
+        "end": end,
+        "factor_version": factor_version,
+        "columns": [c.strip() for c in columns.split(",") if c.strip()] if columns else None,
+        # By default only each invoice's latest write is returned, so recomputes are not double-counted.
+        "latest": not all_versions,
+    }
+
+
+@app.get("/history/items")
+def history_items(
+    supplier: Optional[List[str]] = Query(None),
+    category: Optional[List[str]] = Query(None),
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    factor_version: Optional[List[str]] = Query(None),
+    columns: Optional[str] = None,
+    all_versions: bool = False,
+    limit: int = Query(1000, ge=1, le=100_000),
+):
+    filters = _history_filters(supplier, category, start, end, factor_version, columns, all_versions)
+    try:
+        table = query_items(limit=limit, **filters)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    items = table.to_pylist()
+    return {"count": len(items), "items": items}
+
+
+@app.get("/history/export")
+def history_export(
+    format: str = Query("csv", pattern="^(csv|parquet)$"),
+    supplier: Optional[List[str]] = Query(None),
+    category: Optional[List[str]] = Query(None),
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    factor_version: Optional[List[str]] = Query(None),
+    columns: Optional[str] = None,
+    all_versions: bool = False,
+):
+    filters = _history_filters(supplier, category, start, end, factor_version, columns, all_versions)
+    try:
+        if format == "csv":
+            stream = iter_csv(**filters)
+            first = next(stream)  # surface filter errors before the response starts
+            return StreamingResponse(
+                _prepend(first, stream),
+                media_type="text/csv",
+                headers={"Content-Disposition": "attachment; filename=line_items.csv"},
+            )
+
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".parquet") as tmp:
+            tmp_path = Path(tmp.name)
+        write_parquet(tmp_path, **filters)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return FileResponse(
+        tmp_path,
+        media_type="application/vnd.apache.parquet",
+        filename="line_items.parquet",
+        background=BackgroundTask(tmp_path.unlink),
+    )
+
+
+@app.post("/history/compact")
+def history_compact(month: Optional[List[str]] = Query(None), min_files: int = Query(2, ge=2)):
+    """Merge small per-invoice files into one file per month (all months unless given)."""
+    merged = compact(month, min_files=min_files)
+    return {"compacted": merged}
+
+
+def _prepend(first: bytes, rest):
+    yield first
+    yield from rest
+
+
+@app.get("/suppliers")
+def suppliers(q: Optional[str] = None, fuzzy: bool = False):
+    """Canonical suppliers and the raw spellings mapped to them, for review (fuzzy=true: only fuzzy merges)."""
+    mappings = get_registry().mappings()
+    if fuzzy:
+        mappings = [m for m in mappings if m["fuzzy_aliases"]]
+    if q:
+        needle = q.lower()
+        mappings = [
+            m for m in mappings if needle in m["supplier"].lower() or any(needle in a.lower() for a in m["aliases"])
+        ]
+    return {"count": len(mappings), "suppliers": mappings}
+
+
+@app.post("/suppliers/aliases")
+def set_supplier_alias(body: dict):
+    alias = (body.get("alias") or "").strip()
+    canonical = (body.get("canonical") or "").strip()
+    if not alias or not canonical:
+        raise HTTPException(status_code=400, detail="alias and canonical are required.")
+    return {"alias": alias, "supplier": get_registry().set_alias(alias, canonical)}
+
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
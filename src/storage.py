@@ -1,11 +1,131 @@
-from typing import Dict, Optional
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
 
-ANALYSES: Dict[str, Dict] = {}
+# Without SCOPE3_STORAGE_DIR analyses live in memory for the life of the process. With it, every
+# version and the parsed items are written to disk and read back from there, so CLI runs, other
+# server processes and restarts all see the same (latest) analyses and nothing accumulates in memory.
+STORAGE_DIR = os.getenv("SCOPE3_STORAGE_DIR")
 
+# In-memory store, only used when STORAGE_DIR is not set.
+VERSIONS: Dict[str, List[Dict]] = {}
+PARSED_ITEMS: Dict[str, List[Dict]] = {}
 
-def save_analysis(invoice_id: str, analysis: Dict) -> None:
-    ANALYSES[invoice_id] = analysis
+_lock = threading.Lock()
 
 
-def get_analysis(invoice_id: str) -> Optional[Dict]:
-    return ANALYSES.get(invoice_id)
+def _invoice_dir(invoice_id: str) -> Optional[Path]:
+    if not STORAGE_DIR:
+        return None
+    return Path(STORAGE_DIR) / invoice_id
+
+
+def _write_json(path: Path, payload, exclusive: bool = False) -> bool:
+    """
+    Write via a temp file so readers never see a partial file.
+    With exclusive=True an existing target is left alone and False is returned.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with tmp.open("w", encoding="utf-8") as fh:
+        fh.write(json.dumps(payload, default=str))
+        fh.flush()
+        os.fsync(fh.fileno())  # callers (e.g. the ingest checkpoint) treat a returned save as durable
+    if not exclusive:
+        os.replace(tmp, path)
+        return True
+    try:
+        os.link(tmp, path)
+    except FileExistsError:
+        return False
+    finally:
+        tmp.unlink()
+    return True
+
+
+def _disk_versions(invoice_id: str) -> List[int]:
+    folder = _invoice_dir(invoice_id)
+    if folder is None or not folder.exists():
+        return []
+    return sorted(int(p.stem[1:]) for p in folder.glob("v*.json") if p.stem[1:].isdigit())
+
+
+def is_durable() -> bool:
+    """True when analyses are persisted to disk rather than kept in this process only."""
+    return bool(STORAGE_DIR)
+
+
+def save_analysis(invoice_id: str, analysis: Dict, parsed_items: Optional[List[Dict]] = None) -> int:
+    """
+    Store a new version of an analysis and return its version number (1-based).
+    `parsed_items` (the pre-emissions items it was computed from) are stored with it for recomputes.
+    """
+    if parsed_items is not None:
+        # Written first, so every stored version has the items it can be recomputed from.
+        save_parsed_items(invoice_id, parsed_items)
+    folder = _invoice_dir(invoice_id)
+    with _lock:
+        if folder is None:
+            versions = VERSIONS.setdefault(invoice_id, [])
+            version = len(versions) + 1
+            analysis["version"] = version
+            versions.append(analysis)
+            return version
+        while True:
+            version = max([0] + _disk_versions(invoice_id)) + 1
+            analysis["version"] = version
+            # Another process (server, recompute CLI) may claim the same number; retry with the next one.
+            if _write_json(folder / f"v{version}.json", analysis, exclusive=True):
+                return version
+
+
+def get_analysis(invoice_id: str, version: Optional[int] = None) -> Optional[Dict]:
+    """Return one version of an analysis, the latest by default."""
+    folder = _invoice_dir(invoice_id)
+    if folder is None:
+        versions = VERSIONS.get(invoice_id, [])
+        if version is None:
+            return versions[-1] if versions else None
+        return versions[version - 1] if 0 < version <= len(versions) else None
+
+    on_disk = _disk_versions(invoice_id)
+    if not on_disk:
+        return None
+    wanted = on_disk[-1] if version is None else version
+    if wanted not in on_disk:
+        return None
+    return json.loads((folder / f"v{wanted}.json").read_text(encoding="utf-8"))
+
+
+def list_versions(invoice_id: str) -> List[int]:
+    if _invoice_dir(invoice_id) is None:
+        return list(range(1, len(VERSIONS.get(invoice_id, [])) + 1))
+    return _disk_versions(invoice_id)
+
+
+def save_parsed_items(invoice_id: str, items: List[Dict]) -> None:
+    """Keep the parsed, pre-emissions items so analyses can be recomputed without OCR/LLM."""
+    folder = _invoice_dir(invoice_id)
+    if folder is None:
+        PARSED_ITEMS[invoice_id] = items
+        return
+    _write_json(folder / "parsed.json", items)
+
+
+def get_parsed_items(invoice_id: str) -> Optional[List[Dict]]:
+    folder = _invoice_dir(invoice_id)
+    if folder is None:
+        return PARSED_ITEMS.get(invoice_id)
+    if not (folder / "parsed.json").exists():
+        return None
+    return json.loads((folder / "parsed.json").read_text(encoding="utf-8"))
+
+
+def list_invoice_ids() -> List[str]:
+    if not STORAGE_DIR:
+        return sorted(VERSIONS)
+    if not Path(STORAGE_DIR).exists():
+        return []
+    return sorted(p.name for p in Path(STORAGE_DIR).iterdir() if p.is_dir())
@@ -0,0 +1,285 @@
+"""
+Canonical supplier names, so "ShipFast", "SHIPFAST " and "ShipFast Logistics Inc." aggregate together.
+
+Names are normalized (case, punctuation, legal suffixes) and matched against the registry in two ways:
+- a name that is a canonical name plus generic descriptors ("ShipFast Logistics" vs "ShipFast") maps
+  to it; two descriptor variants ("Acme Services", "Acme Logistics") are never mapped onto each other,
+  and "Acme Steel" and "Acme Packaging" stay separate;
+- otherwise a trigram index finds near-identical spellings (typos) of any known name, as long as their
+  numbers agree ("Center 101" vs "Center 102"). Only suppliers sharing trigrams with the new name are
+  scored, so lookups stay fast with tens of thousands of them.
+Every raw spelling seen is memoized as an alias.
+
+The registry is an append-only JSONL log (SCOPE3_SUPPLIER_REGISTRY, default data/suppliers.jsonl)
+of {"alias": ..., "canonical": ..., "match": ...} entries; later entries win, which is how manual
+corrections made through set_alias override earlier automatic matches. Fuzzy matches are flagged
+(`match: "fuzzy"`) and listed separately by mappings() so they can be reviewed.
+"""
+import json
+import os
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+REGISTRY_PATH = os.getenv("SCOPE3_SUPPLIER_REGISTRY", "data/suppliers.jsonl")
+
+UNKNOWN_SUPPLIER = "Unknown Supplier"
+
+LEGAL_SUFFIXES = {
+    "inc", "incorporated", "ltd", "limited", "llc", "llp", "lp", "co", "corp", "corporation", "company",
+    "plc", "gmbh", "ag", "sa", "sarl", "bv", "nv", "pty", "pte", "oy", "ab", "as", "spa", "srl", "kk",
+}
+
+# Trailing words that describe a business unit rather than name a different company. Words that are
+# often part of a distinct company's name ("industries", "trading", "enterprises") are left out.
+GENERIC_DESCRIPTORS = {
+    "logistics", "group", "holding", "holdings", "services", "service", "solutions", "international", "intl",
+    "global", "worldwide", "usa", "uk", "europe",
+}
+# Shortest core name (letters and digits) the descriptor rule applies to; "ab group" is too ambiguous.
+MIN_CORE_CHARS = 4
+
+# Minimum similarity for a fuzzy match; below it the name becomes a new canonical supplier.
+MATCH_THRESHOLD = 0.85
+# Number of a name's rarest trigrams used to gather candidates.
+BLOCKING_GRAMS = 6
+# Candidates (by shared-trigram count) scored in full per lookup.
+MAX_CANDIDATES = 25
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize_name(name: str) -> str:
+    """Lowercase, drop punctuation and legal suffixes, collapse whitespace."""
+    tokens = _TOKEN_RE.findall((name or "").lower().replace("&", " and "))
+    kept = [tok for i, tok in enumerate(tokens) if i == 0 or tok not in LEGAL_SUFFIXES]
+    return " ".join(kept)
+
+
+def _trigrams(key: str) -> Set[str]:
+    padded = f"  {key} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def _similarity(a_grams: Set[str], b_grams: Set[str], shared: int) -> float:
+    return 2 * shared / (len(a_grams) + len(b_grams))
+
+
+def _core(key: str) -> Optional[str]:
+    """
+    The name without trailing generic descriptors ("shipfast logistics" -> "shipfast"),
+    or None when there are none to strip or the rest is too short to be distinctive.
+    """
+    tokens = key.split()
+    while len(tokens) > 1 and tokens[-1] in GENERIC_DESCRIPTORS:
+        tokens.pop()
+    core = " ".join(tokens)
+    return core if core != key and len("".join(tokens)) >= MIN_CORE_CHARS else None
+
+
+def _numbers(key: str) -> List[str]:
+    return [tok for tok in key.split() if any(ch.isdigit() for ch in tok)]
+
+
+class SupplierRegistry:
+    def __init__(self, path: Optional[str] = None, threshold: float = MATCH_THRESHOLD):
+        self.path = Path(path) if path else None
+        self.threshold = threshold
+        self.names: List[str] = []
+        self._by_name: Dict[str, int] = {}
+        # Every normalized spelling seen (canonical or alias) is a variant pointing at a canonical row,
+        # so a typo of any known spelling can match, not just a typo of the canonical name.
+        self._variant_keys: List[str] = []
+        self._variant_grams: List[Set[str]] = []
+        self._variant_owner: List[int] = []
+        self._variant_index: Dict[str, int] = {}
+        self._by_key: Dict[str, int] = {}
+        # Normalized canonical names only, for the descriptor rule, so an alias never anchors other names.
+        self._canonical_keys: Dict[str, int] = {}
+        self._postings: Dict[str, List[int]] = {}
+        self._aliases: Dict[str, int] = {}
+        self._fuzzy: Set[str] = set()
+        self._lock = threading.RLock()
+        if self.path is not None and self.path.exists():
+            self._replay(self.path)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _replay(self, path: Path) -> None:
+        for line in path.read_text(encoding="utf-8").splitlines():
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # tolerate a truncated last line from an interrupted write
+            self._remember(entry["alias"], self._canonical_index(entry["canonical"]), entry.get("match"))
+
+    def _remember(self, alias: str, idx: int, match: Optional[str]) -> None:
+        self._aliases[alias] = idx
+        self._add_variant(normalize_name(alias), idx)
+        if match == "fuzzy":
+            self._fuzzy.add(alias)
+        else:
+            self._fuzzy.discard(alias)
+
+    def _record(self, alias: str, idx: int, match: str) -> None:
+        self._remember(alias, idx, match)
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a", encoding="utf-8") as fh:
+            fh.write(json.dumps({"alias": alias, "canonical": self.names[idx], "match": match}) + "\n")
+
+    def _canonical_index(self, name: str) -> int:
+        idx = self._by_name.get(name.strip())
+        return self._add(name) if idx is None else idx
+
+    def _add(self, name: str) -> int:
+        idx = len(self.names)
+        self.names.append(name.strip())
+        self._by_name[name.strip()] = idx
+        key = normalize_name(name)
+        self._add_variant(key, idx)
+        if key:
+            self._canonical_keys.setdefault(key, idx)
+        return idx
+
+    def _add_variant(self, key: str, idx: int) -> None:
+        if not key:
+            return
+        if key in self._by_key:
+            # A manual correction can move an existing spelling to a different supplier.
+            self._variant_owner[self._variant_index[key]] = idx
+            self._by_key[key] = idx
+            return
+        variant = len(self._variant_keys)
+        grams = _trigrams(key)
+        self._variant_keys.append(key)
+        self._variant_grams.append(grams)
+        self._variant_owner.append(idx)
+        self._variant_index[key] = variant
+        self._by_key[key] = idx
+        for gram in grams:
+            self._postings.setdefault(gram, []).append(variant)
+
+    def _best_match(self, key: str) -> Optional[int]:
+        grams = _trigrams(key)
+        # Block on the rarest trigrams only: common ones ("ing", " co") would pull in half the registry.
+        postings = sorted((self._postings[g] for g in grams if g in self._postings), key=len)
+        shared: Counter = Counter()
+        for posting in postings[:BLOCKING_GRAMS]:
+            shared.update(posting)
+
+        numbers = _numbers(key)
+        best, best_score = None, self.threshold
+        for variant, _ in shared.most_common(MAX_CANDIDATES):
+            # "Plant 101" vs "Plant 102" is a different site, not a typo.
+            if _numbers(self._variant_keys[variant]) != numbers:
+                continue
+            other = self._variant_grams[variant]
+            score = _similarity(grams, other, len(grams & other))
+            if score >= best_score:
+                best, best_score = self._variant_owner[variant], score
+        return best
+
+    def _find(self, raw: str, key: str) -> Tuple[Optional[int], str]:
+        """Return (canonical row or None, how it matched)."""
+        idx = self._aliases.get(raw)
+        if idx is not None:
+            return idx, "alias"
+        idx = self._by_key.get(key)
+        if idx is not None:
+            return idx, "exact"
+        core = _core(key)
+        # Only onto the bare canonical name: "acme services" may join "acme", never "acme logistics".
+        idx = self._canonical_keys.get(core) if core else None
+        if idx is not None:
+            return idx, "descriptor"
+        idx = self._best_match(key)
+        return idx, "fuzzy"
+
+    def lookup(self, raw: str) -> Optional[str]:
+        """Return the canonical name a raw supplier string would resolve to, without registering anything."""
+        raw = raw if isinstance(raw, str) else ""
+        key = normalize_name(raw)
+        if not key or raw.strip() == UNKNOWN_SUPPLIER:
+            return raw.strip() or UNKNOWN_SUPPLIER
+        with self._lock:
+            idx, _ = self._find(raw, key)
+        return None if idx is None else self.names[idx]
+
+    def resolve(self, raw: str) -> str:
+        """Return the canonical name for a raw supplier string, registering it if it is new."""
+        raw = raw if isinstance(raw, str) else ""
+        idx = self._aliases.get(raw)
+        if idx is not None:
+            return self.names[idx]
+
+        with self._lock:
+            idx = self._aliases.get(raw)
+            if idx is not None:
+                return self.names[idx]
+            key = normalize_name(raw)
+            if not key or raw.strip() == UNKNOWN_SUPPLIER:
+                return raw.strip() or UNKNOWN_SUPPLIER
+            idx, match = self._find(raw, key)
+            if idx is None:
+                idx, match = self._add(raw), "new"
+            self._record(raw, idx, match)
+            return self.names[idx]
+
+    def set_alias(self, alias: str, canonical: str) -> str:
+        """Manually map an alias to a canonical supplier (created if unknown)."""
+        with self._lock:
+            idx = self._by_name.get(canonical.strip())
+            if idx is None:
+                idx = self._by_key.get(normalize_name(canonical))
+            if idx is None:
+                idx = self._add(canonical)
+            self._record(alias, idx, "manual")
+            return self.names[idx]
+
+    def mappings(self) -> List[Dict]:
+        """
+        Canonical suppliers with every alias that resolved to them, for review.
+        `fuzzy_aliases` are the ones merged by similarity alone, the likeliest to need a correction.
+        """
+        grouped: Dict[int, List[str]] = {}
+        for alias, idx in self._aliases.items():
+            grouped.setdefault(idx, []).append(alias)
+        return [
+            {
+                "supplier": name,
+                "aliases": sorted(grouped.get(idx, [])),
+                "fuzzy_aliases": sorted(a for a in grouped.get(idx, []) if a in self._fuzzy),
+            }
+            for idx, name in enumerate(self.names)
+        ]
+
+
+_registry: Optional[SupplierRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> SupplierRegistry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = SupplierRegistry(REGISTRY_PATH)
+    return _registry
+
+
+def resolve_suppliers(items: List[Dict], registry: Optional[SupplierRegistry] = None) -> List[Dict]:
+    """
+    Return copies of the items with canonical `supplier` names; the original is kept as `supplier_raw`.
+    """
+    if registry is None:
+        registry = get_registry()
+    resolved = []
+    for item in items:
+        raw = item.get("supplier_raw", item.get("supplier")) or UNKNOWN_SUPPLIER
+        resolved.append(dict(item, supplier=registry.resolve(raw), supplier_raw=raw))
+    return resolved
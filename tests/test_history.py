@@ -0,0 +1,92 @@
+import io
+from datetime import datetime, timezone
+
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+import pytest
+
+from src import history
+
+MAY = datetime(2026, 5, 3, tzinfo=timezone.utc)
+JUNE = datetime(2026, 6, 10, tzinfo=timezone.utc)
+
+
+def _items(supplier: str, emissions: float, category: str = "steel") -> list:
+    return [{"supplier": supplier, "category": category, "amount_usd": 10.0, "emissions_kg": emissions}]
+
+
+@pytest.fixture
+def root(tmp_path):
+    root = str(tmp_path / "history")
+    history.append_items("INV-1", _items("Acme Steel", 1.0), MAY, "v1", root=root)
+    history.append_items("INV-2", _items("ShipFast", 2.0, "transport"), MAY, "v1", root=root)
+    history.append_items("INV-3", _items("Acme Steel", 3.0), JUNE, "v1", root=root)
+    return root
+
+
+def _ids(table) -> list:
+    return sorted(table["invoice_id"].to_pylist())
+
+
+def test_latest_only_keeps_each_invoices_newest_write(root):
+    recomputed = datetime(2026, 7, 1, tzinfo=timezone.utc)
+    history.append_batch([("INV-1", _items("Acme Steel", 5.0), MAY)], "v2", root=root, recorded_at=recomputed)
+
+    latest = history.query_items(root=root)
+    assert _ids(latest) == ["INV-1", "INV-2", "INV-3"]
+    [row] = [row for row in latest.to_pylist() if row["invoice_id"] == "INV-1"]
+    assert (row["factor_version"], row["emissions_kg"]) == ("v2", 5.0)
+
+    assert history.query_items(root=root, latest=False).num_rows == 4
+    assert _ids(history.query_items(root=root, factor_version="v1", latest=False)) == ["INV-1", "INV-2", "INV-3"]
+
+
+def test_filters_prune_by_date_supplier_and_category(root):
+    assert _ids(history.query_items(root=root, start="2026-06-01")) == ["INV-3"]
+    assert _ids(history.query_items(root=root, end="2026-05-31")) == ["INV-1", "INV-2"]
+    assert _ids(history.query_items(root=root, supplier="Acme Steel")) == ["INV-1", "INV-3"]
+    assert _ids(history.query_items(root=root, category=["transport"])) == ["INV-2"]
+    assert history.list_months(root) == ["2026-05", "2026-06"]
+
+
+def test_columns_are_projected_and_validated(root):
+    table = history.query_items(root=root, columns=["invoice_id", "emissions_kg"])
+    assert table.column_names == ["invoice_id", "emissions_kg"]
+    assert history.query_items(root=root, limit=1).num_rows == 1
+    with pytest.raises(ValueError):
+        history.query_items(root=root, columns=["nope"])
+
+
+def test_empty_store_returns_empty_table(tmp_path):
+    table = history.query_items(root=str(tmp_path / "missing"), columns=["invoice_id"])
+    assert table.num_rows == 0 and table.column_names == ["invoice_id"]
+
+
+def test_csv_and_parquet_exports_match_query(root, tmp_path):
+    columns = ["invoice_id", "supplier", "emissions_kg"]
+    expected = history.query_items(root=root, columns=columns).sort_by("invoice_id")
+
+    csv = b"".join(history.iter_csv(root=root, columns=columns))
+    exported = pa_csv.read_csv(io.BytesIO(csv)).sort_by("invoice_id")
+    assert exported.to_pylist() == expected.to_pylist()
+
+    target = history.write_parquet(tmp_path / "export.parquet", root=root, columns=columns)
+    assert pq.read_table(target).sort_by("invoice_id").to_pylist() == expected.to_pylist()
+
+
+def test_compaction_merges_files_without_changing_results(root):
+    before = history.query_items(root=root, latest=False).sort_by("invoice_id").to_pylist()
+
+    assert history.compact(root=root) == {"2026-05": 2}  # June has a single file
+    assert len(list((history._root(root) / "month=2026-05").glob("*.parquet"))) == 1
+    assert history.compact_month("2026-05", root=root) is None
+    assert history.compact(["2099-01"], root=root) == {}
+    assert history.query_items(root=root, latest=False).sort_by("invoice_id").to_pylist() == before
+
+
+def test_compaction_skips_a_month_already_being_compacted(root):
+    partition = history._root(root) / "month=2026-05"
+    with history._flock(partition / history.COMPACT_LOCK, exclusive=True) as held:
+        assert held
+        assert history.compact_month("2026-05", root=root) is None
+    assert history.compact_month("2026-05", root=root) is not None
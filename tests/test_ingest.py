@@ -0,0 +1,121 @@
+import json
+import threading
+import zipfile
+from datetime import datetime, timezone
+
+import pytest
+
+from src import ingest, storage
+
+
+@pytest.fixture
+def calls(monkeypatch, tmp_path):
+    """Run ingest against durable tmp storage, with a stub pipeline that records what it analyzed."""
+    monkeypatch.setattr(storage, "STORAGE_DIR", str(tmp_path / "store"))
+    compacted = []
+    monkeypatch.setattr(ingest, "compact", lambda months: compacted.append(months) or {m: 2 for m in months})
+    seen = {"analyzed": [], "compacted": compacted}
+    lock = threading.Lock()
+
+    def fake_analyze(content: bytes, filename: str):
+        with lock:
+            seen["analyzed"].append(filename)
+            n = len(seen["analyzed"])
+        parsed = [{"supplier": "Acme", "description": content.decode(), "amount_usd": 1.0}]
+        analysis = {
+            "invoice_id": f"INV-{n}",
+            "analyzed_at": datetime(2026, 5, 3, tzinfo=timezone.utc).isoformat(),
+            "items": parsed,
+        }
+        return analysis, parsed
+
+    monkeypatch.setattr(ingest, "analyze_content", fake_analyze)
+    return seen
+
+
+def _run(tmp_path, *paths, **kwargs):
+    return ingest.ingest(
+        [str(p) for p in paths],
+        workers=kwargs.pop("workers", 2),
+        checkpoint_path=str(tmp_path / "checkpoint.jsonl"),
+        report_path=str(tmp_path / "report.json"),
+        **kwargs,
+    )
+
+
+def _invoices(folder, *names):
+    folder.mkdir(parents=True, exist_ok=True)
+    for name in names:
+        (folder / name).write_text(f"invoice {name}", encoding="utf-8")
+    return folder
+
+
+def test_rerun_skips_checkpointed_files(tmp_path, calls):
+    folder = _invoices(tmp_path / "in", "a.txt", "b.txt")
+
+    first = _run(tmp_path, folder)
+    assert (first["processed"], first["skipped"]) == (2, 0)
+    assert calls["compacted"] == [["2026-05"]]
+    assert len(storage.list_invoice_ids()) == 2
+    assert storage.get_parsed_items("INV-1") is not None
+
+    with (tmp_path / "checkpoint.jsonl").open("a", encoding="utf-8") as fh:
+        fh.write('{"sha256": "trunc')  # a run killed mid-write
+    _invoices(folder, "c.txt")
+    second = _run(tmp_path, folder)
+    assert (second["processed"], second["skipped"]) == (1, 2)
+    assert sorted(calls["analyzed"]) == ["a.txt", "b.txt", "c.txt"]
+
+
+def test_interrupted_run_resumes_where_it_stopped(tmp_path, calls, monkeypatch):
+    folder = _invoices(tmp_path / "in", "a.txt", "b.txt", "c.txt", "d.txt")
+    iter_sources = ingest.iter_sources
+
+    def interrupted_after_two(paths):
+        sources = iter_sources(paths)
+        yield next(sources)
+        yield next(sources)
+        raise KeyboardInterrupt  # Ctrl-C while the files so far are still in flight
+
+    monkeypatch.setattr(ingest, "iter_sources", interrupted_after_two)
+    first = _run(tmp_path, folder, workers=1)
+    assert first["interrupted"]
+    finished = set(calls["analyzed"])
+    entries = [json.loads(line) for line in (tmp_path / "checkpoint.jsonl").read_text().splitlines()]
+    assert {e["source"].rsplit("/", 1)[-1] for e in entries} == finished
+
+    monkeypatch.setattr(ingest, "iter_sources", iter_sources)
+    second = _run(tmp_path, folder)
+    assert second["skipped"] == len(finished)
+    assert sorted(calls["analyzed"]) == ["a.txt", "b.txt", "c.txt", "d.txt"]  # nothing analyzed twice
+
+
+def test_duplicate_content_is_analyzed_once(tmp_path, calls):
+    folder = _invoices(tmp_path / "in", "a.txt")
+    (folder / "copy-of-a.txt").write_text("invoice a.txt", encoding="utf-8")
+
+    report = _run(tmp_path, folder)
+    assert (report["files_seen"], report["processed"], report["duplicates"]) == (2, 1, 1)
+
+
+def test_zip_archives_are_expanded(tmp_path, calls):
+    folder = tmp_path / "in"
+    folder.mkdir()
+    with zipfile.ZipFile(folder / "batch.zip", "w") as archive:
+        archive.writestr("2026/a.pdf", b"invoice a")
+        archive.writestr("2026/b.txt", b"invoice b")
+        archive.writestr("notes.csv", b"not an invoice")
+
+    sources = [source for source, _, _ in ingest.iter_sources([str(folder)])]
+    assert sources == [f"{folder / 'batch.zip'}!2026/a.pdf", f"{folder / 'batch.zip'}!2026/b.txt"]
+    assert _run(tmp_path, folder)["processed"] == 2
+    assert sorted(calls["analyzed"]) == ["a.pdf", "b.txt"]
+
+
+def test_refuses_non_durable_storage(tmp_path, calls, monkeypatch):
+    monkeypatch.setattr(storage, "STORAGE_DIR", None)
+    with pytest.raises(RuntimeError):
+        _run(tmp_path, _invoices(tmp_path / "in", "a.txt"))
+    assert calls["analyzed"] == []
+    with pytest.raises(SystemExit):
+        ingest.main([str(tmp_path / "in"), "--storage-dir", ""])
@@ -0,0 +1,73 @@
+import json
+import random
+from pathlib import Path
+
+from src.aggregate import build_analysis
+from src.emissions import compute_emissions
+from src.recompute import _recompute_chunk
+from src.sector_index import load_sector_index
+
+FACTORS = {"steel_per_kg": 2.0, "packaging_per_kg": 1.5, "transport_per_tkm": 0.06, "other_per_usd": 0.4}
+SECTORS = load_sector_index(str(Path(__file__).resolve().parents[1] / "data" / "spend_factors"))
+
+DESCRIPTIONS = [
+    "Hot rolled steel coil",
+    "Cardboard packaging boxes",
+    "Freight transport Riyadh-Jeddah",
+    "Consulting services",
+    "Wheat flour",
+    "Office supplies",
+    "",
+]
+
+
+def _item(rng: random.Random) -> dict:
+    item = {"supplier": rng.choice(["ShipFast", "Acme Steel", "Green Co"]), "description": rng.choice(DESCRIPTIONS)}
+    if rng.random() < 0.5:
+        item["qty_kg"] = rng.choice([0, 120, 2.5, 33.333, None])
+    if rng.random() < 0.7:
+        item["amount_usd"] = rng.choice([1.0125, 0.0125, 19.99, 250, 1234.565, None])
+    if rng.random() < 0.3:
+        item["weight_tons"] = rng.choice([1, 2.5, None])
+        item["distance_km"] = rng.choice([850, 12.5])
+    if rng.random() < 0.2:
+        item["product_code"] = rng.choice(["1001", "7208.10", "9999"])
+    return item
+
+
+def _scalar(invoice_id: str, items: list) -> dict:
+    return build_analysis(invoice_id, [compute_emissions(item, FACTORS, SECTORS) for item in items])
+
+
+def _dump(analysis: dict) -> str:
+    # Aggregates may come back as 10 or 10.0 depending on frame dtypes; items must match exactly.
+    def _floats(value):
+        if isinstance(value, dict):
+            return {k: _floats(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [_floats(v) for v in value]
+        return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else value
+
+    aggregates = _floats({k: v for k, v in analysis.items() if k != "items"})
+    return json.dumps(dict(aggregates, items=analysis["items"]), sort_keys=True, default=float)
+
+
+def test_half_cent_rounds_like_scalar_path():
+    items = [{"supplier": "Acme", "description": "Consulting", "amount_usd": 1.0125}]
+    [(_, analysis)] = _recompute_chunk([("INV-1", items)], FACTORS, SECTORS)
+    assert analysis["items"][0]["emissions_kg"] == compute_emissions(items[0], FACTORS, SECTORS)["emissions_kg"]
+    assert _dump(analysis) == _dump(_scalar("INV-1", items))
+
+
+def test_recompute_chunk_matches_build_analysis():
+    rng = random.Random(7)
+    chunk = []
+    for n in range(300):
+        items = [_item(rng) for _ in range(rng.randint(1, 12))]
+        items[0]["amount_usd"] = items[0].get("amount_usd") or 10  # build_analysis needs an amount column
+        chunk.append((f"INV-{n}", items))
+
+    for invoice_id, analysis in _recompute_chunk(chunk, FACTORS, SECTORS):
+        expected = _scalar(invoice_id, dict(chunk)[invoice_id])
+        assert _dump(analysis) == _dump(expected), invoice_id
+        assert [list(item) for item in analysis["items"]] == [list(item) for item in expected["items"]]
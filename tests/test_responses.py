@@ -0,0 +1,93 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from src import responses, server, storage
+from src.responses import project_analysis
+
+
+def _analysis(invoice_id: str = "INV-1", items: int = 5) -> dict:
+    rows = [{"supplier": f"Supplier {n}", "description": "Hot rolled steel coil", "emissions_kg": n} for n in range(items)]
+    return {
+        "invoice_id": invoice_id,
+        "analyzed_at": "2026-05-03T00:00:00+00:00",
+        "factor_version": "abc123",
+        "summary": {"total_emissions_kg": float(sum(range(items)))},
+        "hotspots": [],
+        "by_supplier": {},
+        "by_category": {},
+        "items": rows,
+    }
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(storage, "STORAGE_DIR", None)
+    monkeypatch.setattr(storage, "VERSIONS", {})
+    monkeypatch.setattr(storage, "PARSED_ITEMS", {})
+    storage.save_analysis("INV-1", _analysis())
+    storage.save_analysis("INV-BIG", _analysis("INV-BIG", items=200))
+    return TestClient(server.app)
+
+
+def test_views_and_fields_project_the_analysis():
+    analysis = dict(_analysis(), version=1)
+    assert set(project_analysis(analysis, "summary")) == set(responses.SUMMARY_FIELDS) - {"recomputed_at"}
+    assert "items" not in project_analysis(analysis, "no_items")
+    assert project_analysis(analysis, fields=["invoice_id", "summary"]) == {
+        "invoice_id": "INV-1",
+        "summary": analysis["summary"],
+    }
+    with pytest.raises(ValueError):
+        project_analysis(analysis, "everything")
+
+
+def test_unknown_fields_are_rejected(client):
+    response = client.get("/analysis/INV-1", params={"fields": "summary,bogus"})
+    assert response.status_code == 400
+    assert "bogus" in response.json()["detail"]
+    assert client.get("/analysis/INV-1", params={"view": "bogus"}).status_code == 400
+
+
+def test_items_are_paginated(client):
+    body = client.get("/analysis/INV-1", params={"fields": "items", "items_offset": 1, "items_limit": 2}).json()
+    assert [item["emissions_kg"] for item in body["items"]] == [1, 2]
+    assert body["items_page"] == {"offset": 1, "limit": 2, "total": 5}
+    assert client.get("/analysis/INV-1", params={"items_limit": 0}).status_code == 422
+
+
+def test_etag_revalidation_on_get_and_head(client):
+    first = client.get("/analysis/INV-1")
+    etag = first.headers["etag"]
+    assert client.get("/analysis/INV-1", headers={"If-None-Match": etag}).status_code == 304
+
+    head = client.head("/analysis/INV-1")
+    assert (head.status_code, head.headers["etag"], head.content) == (200, etag, b"")
+    assert client.head("/analysis/INV-1", headers={"If-None-Match": etag}).status_code == 304
+
+    other = client.get("/analysis/INV-1", params={"view": "summary"})
+    assert other.headers["etag"] != etag
+
+
+def test_post_ignores_if_none_match(client, monkeypatch):
+    analysis = _analysis("INV-NEW")
+    monkeypatch.setattr(server, "analyze_content", lambda content, filename: (dict(analysis), analysis["items"]))
+    first = client.post("/analyze_invoice", files={"file": ("a.txt", b"invoice")})
+    second = client.post(
+        "/analyze_invoice", files={"file": ("a.txt", b"invoice")}, headers={"If-None-Match": first.headers["etag"]}
+    )
+    assert (first.status_code, second.status_code) == (200, 200)
+    assert storage.get_parsed_items("INV-NEW") == analysis["items"]
+
+
+def test_only_large_bodies_are_compressed(client):
+    small = client.get("/analysis/INV-1", params={"view": "summary"}, headers={"Accept-Encoding": "gzip"})
+    assert len(small.content) < responses.COMPRESS_MIN_BYTES
+    assert "content-encoding" not in small.headers
+
+    large = client.get("/analysis/INV-BIG", headers={"Accept-Encoding": "gzip"})
+    assert large.headers["content-encoding"] == "gzip"
+    assert len(large.json()["items"]) == 200  # decoded transparently by the client
+
+    identity = client.get("/analysis/INV-BIG", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in identity.headers
+    assert identity.headers["etag"] == large.headers["etag"]
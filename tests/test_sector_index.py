@@ -0,0 +1,89 @@
+import pandas as pd
+import pytest
+
+from src import sector_index
+from src.emissions import compute_emissions, compute_emissions_frame
+from src.factors import factor_version
+from src.sector_index import CACHE_NAME, load_sector_index
+
+FACTORS = {"steel_per_kg": 2.0, "packaging_per_kg": 1.5, "transport_per_tkm": 0.06, "other_per_usd": 0.4}
+
+SECTORS_CSV = """code,name,kg_co2e_per_usd
+111,Crop production,1.10
+3118,Bakeries,0.80
+311,Food manufacturing,0.90
+541,Professional services,0.15
+"""
+
+MAPPINGS_CSV = """type,value,code
+keyword,flour,311
+keyword,wheat flour,3118
+keyword,consulting,541
+code,1001,111
+code,19,3118
+"""
+
+
+@pytest.fixture
+def table(tmp_path):
+    folder = tmp_path / "spend_factors"
+    folder.mkdir()
+    (folder / "sectors.csv").write_text(SECTORS_CSV, encoding="utf-8")
+    (folder / "mappings.csv").write_text(MAPPINGS_CSV, encoding="utf-8")
+    return folder
+
+
+def _code(index, **item):
+    match = index.factor_for(**item)
+    return match and match[0]
+
+
+def test_sector_code_beats_product_code_beats_keywords(table):
+    index = load_sector_index(str(table))
+    description = "Organic wheat flour, 25kg bags"
+    assert _code(index, description=description, sector_code="541110", product_code="1001") == "541"
+    assert _code(index, description=description, product_code="1001.90") == "111"
+    assert _code(index, description=description) == "3118"  # longest phrase, not the first word
+    assert _code(index, description="flour") == "311"
+    assert _code(index, description=description, sector_code="999", product_code="9999") == "3118"
+    assert _code(index, description="office chairs") is None
+
+
+def test_unset_table_means_no_sector_factors(table, monkeypatch):
+    monkeypatch.setattr(sector_index, "SECTOR_TABLE_DIR", None)
+    assert load_sector_index() is None
+    monkeypatch.setattr(sector_index, "SECTOR_TABLE_DIR", str(table))
+    assert load_sector_index() is load_sector_index(str(table))
+    assert load_sector_index(str(table / "missing")) is None
+
+
+def test_index_is_rebuilt_when_the_csvs_change(table):
+    first = load_sector_index(str(table))
+    assert load_sector_index(str(table)) is first
+    assert (table / CACHE_NAME).exists()
+
+    (table / "sectors.csv").write_text(SECTORS_CSV.replace("0.15", "0.25"), encoding="utf-8")
+    second = load_sector_index(str(table))
+    assert second is not first
+    assert second.factor_for("consulting") == ("541", 0.25)
+    assert second.fingerprint != first.fingerprint
+    assert factor_version(FACTORS, second) != factor_version(FACTORS, first)
+
+    # A fresh process reads the pickle written for the new CSVs rather than the stale one.
+    sector_index._load_cached.cache_clear()
+    assert load_sector_index(str(table)).factor_for("consulting") == ("541", 0.25)
+
+
+def test_unmatched_spend_falls_back_to_other_per_usd(table):
+    index = load_sector_index(str(table))
+    matched = {"description": "Consulting retainer", "amount_usd": 100.0}
+    unmatched = {"description": "Office chairs", "amount_usd": 100.0}
+
+    assert compute_emissions(matched, FACTORS, index)["emissions_kg"] == 15.0
+    assert compute_emissions(matched, FACTORS, index)["sector"] == "541"
+    assert compute_emissions(unmatched, FACTORS, index)["emissions_kg"] == 40.0
+    assert "sector" not in compute_emissions(unmatched, FACTORS, index)
+    assert compute_emissions(matched, FACTORS, None)["emissions_kg"] == 40.0
+
+    frame = compute_emissions_frame(pd.DataFrame([matched, unmatched]), FACTORS, index)
+    assert frame["emissions_kg"].tolist() == [15.0, 40.0]
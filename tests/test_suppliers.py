@@ -0,0 +1,75 @@
+import json
+
+from src.suppliers import UNKNOWN_SUPPLIER, SupplierRegistry, normalize_name, resolve_suppliers
+
+KNOWN = ["Acme", "Acme Steel", "ShipFast", "Northwind Traders", "Riverside Plant 101"]
+
+
+def _registry(path=None, **kwargs) -> SupplierRegistry:
+    registry = SupplierRegistry(str(path) if path else None, **kwargs)
+    for name in KNOWN:
+        registry.resolve(name)
+    return registry
+
+
+def test_normalize_name_drops_case_punctuation_and_legal_suffixes():
+    assert normalize_name("  SHIPFAST, Inc. ") == "shipfast"
+    assert normalize_name("Smith & Sons Co.") == "smith and sons"
+    assert normalize_name("Co-op Ltd") == "co op"  # a leading suffix word is part of the name
+    assert normalize_name("") == ""
+
+
+def test_descriptor_variants_map_onto_the_bare_name_only():
+    registry = _registry()
+    assert registry.resolve("ShipFast Logistics Inc.") == "ShipFast"
+    assert registry.resolve("ACME Services") == "Acme"
+    assert registry.resolve("Acme Steel Group") == "Acme Steel"
+    assert registry.resolve("Acme Packaging") == "Acme Packaging"  # a different product line, not a descriptor
+    assert registry.resolve("Acme Steel Industries") == "Acme Steel Industries"
+
+    # Two descriptor variants of an unknown name never merge into each other.
+    assert registry.resolve("Globex Services") == "Globex Services"
+    assert registry.resolve("Globex Logistics") == "Globex Logistics"
+
+
+def test_fuzzy_matches_respect_threshold_and_numbers():
+    registry = _registry()
+    assert registry.resolve("Northwnd Traders") == "Northwind Traders"
+    assert registry.resolve("Riverside Plant 102") == "Riverside Plant 102"
+    assert [m["fuzzy_aliases"] for m in registry.mappings() if m["supplier"] == "Northwind Traders"] == [
+        ["Northwnd Traders"]
+    ]
+
+    strict = _registry(threshold=0.95)
+    assert strict.resolve("Northwnd Traders") == "Northwnd Traders"
+
+
+def test_lookup_does_not_register_names(tmp_path):
+    path = tmp_path / "suppliers.jsonl"
+    registry = _registry(path)
+    before = path.read_text(encoding="utf-8")
+
+    assert registry.lookup("ShipFast Logistics") == "ShipFast"
+    assert registry.lookup("Totally New Supplier") is None
+    assert registry.lookup("") == UNKNOWN_SUPPLIER
+    assert len(registry) == len(KNOWN)
+    assert path.read_text(encoding="utf-8") == before
+
+
+def test_manual_alias_survives_replay(tmp_path):
+    path = tmp_path / "suppliers.jsonl"
+    registry = _registry(path)
+    assert registry.resolve("Northwnd Traders") == "Northwind Traders"
+    registry.set_alias("Northwnd Traders", "Northwnd Trading Co")
+
+    replayed = SupplierRegistry(str(path))
+    assert replayed.resolve("Northwnd Traders") == "Northwnd Trading Co"
+    assert replayed.lookup("NORTHWND TRADERS") == "Northwnd Trading Co"
+    assert all(not m["fuzzy_aliases"] for m in replayed.mappings())
+    assert json.loads(path.read_text(encoding="utf-8").splitlines()[-1])["match"] == "manual"
+
+    items = resolve_suppliers([{"supplier": "Northwnd Traders"}, {"supplier": None}], replayed)
+    assert [(i["supplier"], i["supplier_raw"]) for i in items] == [
+        ("Northwnd Trading Co", "Northwnd Traders"),
+        (UNKNOWN_SUPPLIER, UNKNOWN_SUPPLIER),
+    ]